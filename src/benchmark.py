@@ -0,0 +1,289 @@
+import csv
+import gzip
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import memory_goals
+from csr_graph import load_graph
+from dbcli import NODE_GOALS, open_backend, pop_flag, pop_option
+from snapshot import export_snapshot, load_snapshot
+
+# Benchmark suite: generates a reproducible synthetic taxonomy, times the
+# import, goals 1-12 and deletion, and writes the timings as JSON so runs can
+# be compared across commits.
+#
+# Usage: python benchmark.py [--nodes N] [--fanout-skew A] [--cycle-rate R]
+#                            [--seed S] [--samples N] [--repeat N] [--neo4j]
+#                            [--output FILE] [--baseline FILE] [--threshold F]
+#
+# Without --neo4j everything runs against the in-process graph and no server
+# is needed. --neo4j also imports the generated dump into the configured Neo4j,
+# runs the goals there and then deletes every node: only point it at a scratch
+# database. With --baseline, any timing more than `threshold` (0.2 = 20%)
+# slower than the baseline is reported and the exit status is 1.
+
+RESULTS_VERSION = 1
+
+
+# Taxonomy-like category graph. Node i > 0 hangs off an earlier category,
+# chosen with a bias towards the oldest ones: the larger `fanout_skew`, the
+# more children pile up on a few hub categories. Some categories get a second
+# parent, a few get none (extra roots), and with probability `cycle_rate` a
+# category also links back to one of its ancestors, closing a cycle.
+def generate_taxonomy(path, node_count=100000, fanout_skew=1.5, cycle_rate=0.001, seed=0,
+                      extra_parent_rate=0.3, root_rate=0.0005):
+    rng = random.Random(seed)
+    names = [category_name(i) for i in range(node_count)]
+    parents = [[] for _ in range(node_count)]
+    edge_count = 0
+    with gzip.open(path, 'wt', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file, quotechar='"', escapechar='\\', doublequote=False)
+        for child in range(1, node_count):
+            if rng.random() < root_rate:
+                continue
+            chosen = {int(child * rng.random() ** (1 + fanout_skew))}
+            if rng.random() < extra_parent_rate:
+                chosen.add(rng.randrange(child))
+            for parent in chosen:
+                parents[child].append(parent)
+                writer.writerow((names[parent], names[child]))
+                edge_count += 1
+            if rng.random() < cycle_rate:
+                # Walk up a few levels and point the ancestor back at us
+                ancestor = child
+                for _ in range(rng.randint(1, 4)):
+                    if not parents[ancestor]:
+                        break
+                    ancestor = rng.choice(parents[ancestor])
+                if ancestor != child:
+                    writer.writerow((names[child], names[ancestor]))
+                    edge_count += 1
+    return names, edge_count
+
+
+def category_name(i):
+    # A few names carry the characters the importer has to escape
+    if i % 997 == 0:
+        return f'Category "{i}", quoted'
+    return f"Category {i}"
+
+
+class Timings:
+    def __init__(self, repeat=3):
+        self.repeat = repeat
+        self.results = {}
+
+    # Runs `function` `repeat` times and keeps the median; `ops` is the number
+    # of operations one run performs, for the throughput column
+    def measure(self, name, function, ops=1, repeat=None):
+        runs = []
+        for _ in range(repeat or self.repeat):
+            started = time.perf_counter()
+            function()
+            runs.append(time.perf_counter() - started)
+        seconds = statistics.median(runs)
+        self.results[name] = {
+            "seconds": seconds,
+            "runs": len(runs),
+            "ops": ops,
+            "ops_per_second": ops / seconds if seconds else None,
+        }
+        print(f"{name:<32} {seconds:10.4f} s  {ops / seconds if seconds else 0:12.0f} ops/s")
+
+    def skip(self, name, reason):
+        self.results[name] = {"skipped": reason}
+        print(f"{name:<32} skipped: {reason}")
+
+
+def consume(iterable):
+    for _ in iterable:
+        pass
+
+
+# Goals 1-12 through the shared goal API, so the same code times both the
+# in-memory graph and a Neo4j transaction
+def time_goals(timings, prefix, backend, tx, samples, path_pairs, search_depth, path_limit, find_paths):
+    for goal in NODE_GOALS:
+        if goal == 1:
+            run = lambda name: consume(backend.find_all_children(tx, name))
+        elif goal == 2:
+            run = lambda name: backend.count_all_children(tx, name)
+        elif goal == 3:
+            run = lambda name: consume(backend.find_all_grandchildren(tx, name))
+        elif goal == 4:
+            run = lambda name: consume(backend.find_all_parents(tx, name))
+        elif goal == 5:
+            run = lambda name: backend.count_all_parents(tx, name)
+        else:
+            run = lambda name: consume(backend.find_all_grandparents(tx, name))
+        timings.measure(f"{prefix}.goal_{goal}", lambda: [run(name) for name in samples], len(samples))
+
+    timings.measure(f"{prefix}.goal_7", lambda: backend.count_unique_nodes(tx))
+    timings.measure(f"{prefix}.goal_8", lambda: consume(backend.find_root_node(tx)))
+    timings.measure(f"{prefix}.goal_9", lambda: consume(backend.find_nodes_with_most_children(tx)))
+    timings.measure(f"{prefix}.goal_10", lambda: consume(backend.find_nodes_with_least_children(tx)))
+
+    def rename_and_restore():
+        for name in samples:
+            backend.rename_node(tx, name, name + " (renamed)")
+            backend.rename_node(tx, name + " (renamed)", name)
+    timings.measure(f"{prefix}.goal_11", rename_and_restore, 2 * len(samples))
+
+    def enumerate_paths():
+        for start, end in path_pairs:
+            consume(itertools.islice(find_paths(tx, start, end, search_depth), path_limit))
+    timings.measure(f"{prefix}.goal_12", enumerate_paths, len(path_pairs))
+
+    def count_paths():
+        for start, end in path_pairs:
+            backend.count_all_paths(tx, start, end, search_depth)
+    timings.measure(f"{prefix}.goal_12_count", count_paths, len(path_pairs))
+
+
+# Start/end pairs for goal 12: each end is reached by walking down from its
+# start, so every pair has at least one path
+def sample_path_pairs(graph, names, count, rng, max_steps=5):
+    pairs = []
+    while len(pairs) < count:
+        start = graph.node_id(names[rng.randrange(min(len(names), 50))])
+        node = start
+        for _ in range(rng.randint(2, max_steps)):
+            children = list(graph.children(node))
+            if not children:
+                break
+            node = rng.choice(children)
+        if node != start:
+            pairs.append((graph.name(start), graph.name(node)))
+    return pairs
+
+
+def benchmark_memory(timings, data_path, work_dir, samples, path_pairs, search_depth, path_limit, edge_count):
+    timings.measure("memory.import_csv", lambda: load_graph(data_path), edge_count, repeat=1)
+    graph = load_graph(data_path)
+
+    snapshot_path = os.path.join(work_dir, "benchmark.snapshot")
+    timings.measure("memory.snapshot_export", lambda: export_snapshot(graph, snapshot_path), graph.edge_count, repeat=1)
+    timings.measure("memory.snapshot_load", lambda: load_snapshot(snapshot_path), graph.edge_count)
+
+    with open_backend(None, graph) as (backend, tx):
+        time_goals(timings, "memory", backend, tx, samples, path_pairs, search_depth, path_limit,
+                   memory_goals.find_all_paths)
+    timings.skip("memory.goal_13", "deletion only applies to Neo4j")
+
+
+def benchmark_neo4j(timings, data_path, samples, path_pairs, search_depth, path_limit, edge_count):
+    from import_data import import_data
+    from utils import get_driver, close_driver, delete_all_nodes_in_batches
+
+    timings.measure("neo4j.import", lambda: import_data(data_path), edge_count, repeat=1)
+    driver = get_driver()
+    with open_backend(driver, None) as (backend, tx):
+        time_goals(timings, "neo4j", backend, tx, samples, path_pairs, search_depth, path_limit,
+                   backend.find_all_paths_pruned)
+    node_count = driver.execute_query("MATCH (n:Category) RETURN count(n) AS count").records[0]["count"]
+    timings.measure("neo4j.goal_13", lambda: delete_all_nodes_in_batches(5000, 3, 3), node_count, repeat=1)
+    close_driver()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Benchmarks whose median got slower than the baseline by more than `threshold`.
+# Timings under `min_seconds` are mostly timer noise and are never flagged.
+def compare_results(current, baseline, threshold=0.2, min_seconds=0.001):
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if "seconds" not in result or not before or "seconds" not in before:
+            continue
+        change = result["seconds"] / before["seconds"] - 1 if before["seconds"] else 0
+        regressed = change > threshold and result["seconds"] >= min_seconds
+        print(f"{name:<32} {before['seconds']:10.4f} s -> {result['seconds']:10.4f} s  {change:+8.1%}"
+              f"  {'REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append((name, change))
+    return regressions
+
+
+def main():
+    args = sys.argv[1:]
+    use_neo4j = pop_flag(args, "--neo4j")
+    node_count = pop_option(args, "--nodes", 100000)
+    fanout_skew = pop_option(args, "--fanout-skew", 1.5, cast=float)
+    cycle_rate = pop_option(args, "--cycle-rate", 0.001, cast=float)
+    seed = pop_option(args, "--seed", 0)
+    sample_count = pop_option(args, "--samples", 200)
+    repeat = pop_option(args, "--repeat", 3)
+    search_depth = pop_option(args, "--depth", 6)
+    path_limit = pop_option(args, "--path-limit", 10000)
+    output = pop_option(args, "--output", "benchmark_results.json", cast=str)
+    baseline_path = pop_option(args, "--baseline", cast=str)
+    threshold = pop_option(args, "--threshold", 0.2, cast=float)
+    if args:
+        print(f"Unknown arguments: {' '.join(args)}")
+        sys.exit(1)
+
+    params = {
+        "nodes": node_count, "fanout_skew": fanout_skew, "cycle_rate": cycle_rate, "seed": seed,
+        "samples": sample_count, "depth": search_depth, "path_limit": path_limit,
+    }
+    timings = Timings(repeat)
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_path = os.path.join(work_dir, "taxonomy_benchmark.csv.gz")
+        started = time.perf_counter()
+        names, edge_count = generate_taxonomy(data_path, node_count, fanout_skew, cycle_rate, seed)
+        print(f"Generated {node_count} categories and {edge_count} relationships "
+              f"in {time.perf_counter() - started:.4f} seconds.")
+
+        # Categories without any relationship never make it into the dump
+        graph = load_graph(data_path)
+        names = [name for name in names if graph.node_id(name) is not None]
+        rng = random.Random(seed + 1)
+        samples = rng.sample(names, min(sample_count, len(names)))
+        path_pairs = sample_path_pairs(graph, names, max(1, sample_count // 20), rng)
+        del graph
+
+        benchmark_memory(timings, data_path, work_dir, samples, path_pairs, search_depth, path_limit, edge_count)
+        if use_neo4j:
+            benchmark_neo4j(timings, data_path, samples, path_pairs, search_depth, path_limit, edge_count)
+
+    current = {
+        "version": RESULTS_VERSION,
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": params,
+        "results": timings.results,
+    }
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(current, file, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline.get("params") != params:
+            print("Warning: the baseline was recorded with different parameters.")
+        regressions = compare_results(current, baseline, threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than the baseline by more than {threshold:.0%}.")
+            sys.exit(1)
+        print(f"No regressions beyond {threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import json
+import socket
+import sys
+import time
+from config import socket_path
+
+# Thin client for server.py: sends one goal request and prints the reply.
+# Only the standard library is imported, so a call costs little more than the
+# query itself.
+#
+# Usage: python client.py <goal_number> [args] [--top K] [--level-limit N] [--count] [--undirected]
+#                                              [--socket PATH]
+
+
+def request_goal(request, path=socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        connection.sendall(json.dumps(request).encode('utf-8') + b"\n")
+        with connection.makefile('rb') as replies:
+            for raw in replies:
+                message = json.loads(raw)
+                yield message
+                if "line" not in message:
+                    return
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python client.py <goal_number> [args] [--top K] [--level-limit N] [--count] [--undirected] [--socket PATH]")
+        sys.exit(1)
+    args = sys.argv[2:]
+    request = {"goal": int(sys.argv[1]), "count": "--count" in args}
+    if request["count"]:
+        args.remove("--count")
+    if "--undirected" in args:
+        args.remove("--undirected")
+        request["undirected"] = True
+    path = socket_path
+    for option in ("--top", "--level-limit", "--socket"):
+        if option in args:
+            position = args.index(option)
+            value = args[position + 1]
+            del args[position:position + 2]
+            if option == "--top":
+                request["top"] = int(value)
+            elif option == "--level-limit":
+                request["level_limit"] = int(value)
+            else:
+                path = value
+    request["args"] = args
+
+    start_time = time.time()
+    try:
+        for message in request_goal(request, path):
+            if "line" in message:
+                print(message["line"])
+            elif not message["ok"]:
+                print(message["error"])
+                sys.exit(1)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"No query server is listening on {path}. Start one with: python server.py")
+        sys.exit(1)
+    print(f"Goal {request['goal']} executed in {time.time() - start_time:.4f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,20 @@
 # config.py
+import os
 
 uri = "bolt://localhost:7687"
 username = "neo4j"
 password = "password"
+
+# Taxonomy dump used by the importer and the in-memory backend
+data_file = "taxonomy_iw.csv.gz"
+# Memory-mapped export of data_file, written by snapshot.py
+snapshot_file = "taxonomy_iw.snapshot"
+# Local goal-result cache shared by dbcli processes (see result_cache.py).
+# The path is absolute, beside this file, so every process invalidates and
+# reads the same cache whatever its working directory.
+cache_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".dbcli_cache.sqlite")
+cache_max_entries = 10000
+# Unix domain socket of the long-lived query server (server.py / client.py)
+socket_path = "/tmp/wikitaxonomy-dbcli.sock"
+# Goal 12: Cypher branches running at once against the server
+goal12_max_in_flight = 8
@@ -0,0 +1,192 @@
+import csv
+import difflib
+import gzip
+import threading
+from array import array
+from name_index import NameIndex
+from degree_index import DegreeIndex
+from reachability import ReachabilityIndex
+
+# In-process copy of the HAS_SUBCATEGORY graph.
+# Every category gets an integer id; edges are stored as compressed sparse rows:
+# the children of node i are fwd_targets[fwd_offsets[i]:fwd_offsets[i + 1]],
+# and its parents are rev_targets[rev_offsets[i]:rev_offsets[i + 1]].
+# Ids are assigned in name order, so `index` resolves names by binary search.
+
+
+class CSRGraph:
+    def __init__(self, index, fwd_offsets, fwd_targets, rev_offsets, rev_targets):
+        self.index = index
+        self.fwd_offsets = fwd_offsets
+        self.fwd_targets = fwd_targets
+        self.rev_offsets = rev_offsets
+        self.rev_targets = rev_targets
+        # Renames are kept beside the index so ids and name order stay stable
+        self.renamed = {}
+        self.renamed_ids = {}
+        self._degrees = None
+        self._reachability = None
+        # The query server shares one graph between its handler threads:
+        # renames and the lazy index builds each run under this lock
+        self.lock = threading.RLock()
+
+    @property
+    def degrees(self):
+        if self._degrees is None:
+            with self.lock:
+                if self._degrees is None:
+                    self._degrees = DegreeIndex.build(self)
+        return self._degrees
+
+    @property
+    def reachability(self):
+        if self._reachability is None:
+            with self.lock:
+                if self._reachability is None:
+                    self._reachability = ReachabilityIndex.build(self)
+        return self._reachability
+
+    @property
+    def node_count(self):
+        return len(self.index)
+
+    @property
+    def edge_count(self):
+        return len(self.fwd_targets)
+
+    def node_id(self, name):
+        node_id = self.renamed_ids.get(name)
+        if node_id is not None:
+            return node_id
+        node_id = self.index.lookup(name)
+        if node_id is None or node_id in self.renamed:
+            return None
+        return node_id
+
+    # node_id() for a batch of names, resolved by one NameIndex.lookup_many
+    def node_ids(self, names):
+        node_ids = self.index.lookup_many(names)
+        if not self.renamed:
+            return node_ids
+        return [
+            self.renamed_ids.get(name, None if node_id in self.renamed else node_id)
+            for name, node_id in zip(names, node_ids)
+        ]
+
+    def name(self, node_id):
+        name = self.renamed.get(node_id)
+        if name is None:
+            name = self.index.name(node_id)
+        return name
+
+    # Like NameIndex.suggest, but over the current names: names renamed away
+    # are skipped and new names are candidates too
+    def suggest(self, name, limit=5, max_candidates=500):
+        if not self.renamed:
+            return self.index.suggest(name, limit, max_candidates)
+        for length in range(len(name), 0, -1):
+            prefix = name[:length]
+            candidates = [
+                candidate for candidate in self.index.with_prefix(prefix, max_candidates)
+                if self.node_id(candidate) is not None
+            ]
+            candidates.extend(new_name for new_name in self.renamed_ids if new_name.startswith(prefix))
+            if candidates:
+                return difflib.get_close_matches(name, candidates, n=limit, cutoff=0)
+        return []
+
+    def children(self, node_id):
+        return self.fwd_targets[self.fwd_offsets[node_id]:self.fwd_offsets[node_id + 1]]
+
+    def parents(self, node_id):
+        return self.rev_targets[self.rev_offsets[node_id]:self.rev_offsets[node_id + 1]]
+
+    def out_degree(self, node_id):
+        return self.fwd_offsets[node_id + 1] - self.fwd_offsets[node_id]
+
+    def in_degree(self, node_id):
+        return self.rev_offsets[node_id + 1] - self.rev_offsets[node_id]
+
+    # Names are unique, as under the Neo4j constraint
+    def rename(self, old_name, new_name):
+        with self.lock:
+            node_id = self.node_id(old_name)
+            if node_id is None:
+                raise ValueError(f"Node with name '{old_name}' does not exist.")
+            if self.node_id(new_name) is not None:
+                raise ValueError(f"Node with name '{new_name}' already exists.")
+            # The new name resolves before the old one stops resolving, so a
+            # concurrent lookup always finds the node under one of them
+            self.renamed_ids[new_name] = node_id
+            self.renamed[node_id] = new_name
+            self.renamed_ids.pop(old_name, None)
+            return node_id
+
+    @classmethod
+    def from_edges(cls, edges):
+        ids = {}
+        names = []
+        sources = array('i')
+        targets = array('i')
+        for category, subcategory in edges:
+            source = ids.get(category)
+            if source is None:
+                source = ids[category] = len(names)
+                names.append(category)
+            target = ids.get(subcategory)
+            if target is None:
+                target = ids[subcategory] = len(names)
+                names.append(subcategory)
+            sources.append(source)
+            targets.append(target)
+        del ids
+
+        # Renumber in name order so the name list doubles as the sorted index
+        node_count = len(names)
+        order = sorted(range(node_count), key=names.__getitem__)
+        rank = array('i', bytes(4 * node_count))
+        for position, node_id in enumerate(order):
+            rank[node_id] = position
+        names = [names[node_id] for node_id in order]
+        sources = array('i', (rank[source] for source in sources))
+        targets = array('i', (rank[target] for target in targets))
+
+        fwd_offsets, fwd_targets = build_csr(node_count, sources, targets)
+        rev_offsets, rev_targets = build_csr(node_count, targets, sources)
+        return cls(NameIndex(names), fwd_offsets, fwd_targets, rev_offsets, rev_targets)
+
+
+# Counting sort of (source, target) pairs into offset/target arrays.
+# Duplicate edges are dropped, matching the MERGE semantics of the importer.
+def build_csr(node_count, sources, targets):
+    counts = array('q', bytes(8 * (node_count + 1)))
+    for source in sources:
+        counts[source + 1] += 1
+    for i in range(node_count):
+        counts[i + 1] += counts[i]
+
+    slots = array('i', bytes(4 * len(sources)))
+    cursor = counts[:-1]
+    for source, target in zip(sources, targets):
+        slots[cursor[source]] = target
+        cursor[source] += 1
+
+    offsets = array('q', [0])
+    packed = array('i')
+    for i in range(node_count):
+        packed.extend(dict.fromkeys(slots[counts[i]:counts[i + 1]]))
+        offsets.append(len(packed))
+    return offsets, packed
+
+
+def read_edges(file_path):
+    opener = gzip.open if file_path.endswith('.gz') else open
+    with opener(file_path, 'rt', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file, quotechar='"', escapechar='\\', doublequote=False)
+        for row in reader:
+            if len(row) == 2:
+                yield row[0], row[1]
+
+
+def load_graph(file_path):
+    return CSRGraph.from_edges(read_edges(file_path))
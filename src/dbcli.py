@@ -1,14 +1,125 @@
+import os
 import sys
 import asyncio
 import time
-from neo4j import GraphDatabase
-from utils import get_driver, close_driver, node_exists, delete_all_nodes_in_batches
-from goals import (
-    find_root_node,
-    find_nodes_with_most_children, find_nodes_with_least_children, rename_node,
-    find_all_paths, find_all_children, count_all_children, find_all_grandchildren,
-    find_all_parents, count_all_parents, find_all_grandparents, count_unique_nodes, find_shortest_path
-)
+import contextlib
+import csv
+from itertools import chain
+import memory_goals
+from snapshot import open_graph
+from path_output import PathTrie, write_document
+from instrumentation import configure, set_goal, instrumented, instrumented_async, close_metrics, record_batch
+from result_cache import ResultCache, invalidate_cache
+from config import goal12_max_in_flight
+
+NODE_GOALS = [1, 2, 3, 4, 5, 6]
+GRAPH_GOALS = [7, 8, 9, 10]
+REACH_GOALS = [14, 15, 16, 17, 18]
+HOP_GOALS = [20, 21]
+CACHED_GOALS = [1, 2, 3, 4, 5, 6, 7, 14, 15, 16]
+
+def pop_flag(args, flag):
+    if flag in args:
+        args.remove(flag)
+        return True
+    return False
+
+# goals.py and utils.py load the neo4j driver and tqdm, so they are imported
+# only on the Neo4j code path and a --memory call starts without them
+def neo4j_goals():
+    import goals
+    return goals
+
+# Yields the goal module together with the object its functions take as `tx`:
+# an open Neo4j transaction, or the in-memory graph when --memory is used.
+# With `watch`, the transaction is wrapped by the ErrorWatch first; with
+# `timeout`, Neo4j aborts the transaction after that many seconds.
+@contextlib.contextmanager
+def open_backend(driver, graph, watch=None, timeout=None):
+    if graph is not None:
+        yield memory_goals, graph
+        return
+    with driver.session() as session:
+        with session.begin_transaction(timeout=timeout) as tx, instrumented(watch.wrap(tx) if watch else tx) as tx:
+            yield neo4j_goals(), tx
+
+# The goal functions catch and print query errors and return what they have
+# (often 0 or nothing). ErrorWatch notes every error raised by a query or its
+# result on the way, so that output is never cached as a real answer.
+class ErrorWatch:
+    def __init__(self):
+        self.failed = False
+
+    def wrap(self, tx):
+        return WatchedTx(tx, self)
+
+    def call(self, function, *args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            self.failed = True
+            raise
+
+class WatchedTx:
+    def __init__(self, tx, watch):
+        self.tx = tx
+        self.watch = watch
+
+    def run(self, query, parameters=None, **kwargs):
+        return WatchedResult(self.watch.call(self.tx.run, query, parameters, **kwargs), self.watch)
+
+    def __getattr__(self, name):
+        return getattr(self.tx, name)
+
+class WatchedResult:
+    def __init__(self, result, watch):
+        self.result = result
+        self.watch = watch
+
+    def __iter__(self):
+        records = iter(self.result)
+        while True:
+            try:
+                record = self.watch.call(next, records)
+            except StopIteration:
+                return
+            yield record
+
+    def __getattr__(self, name):
+        attribute = getattr(self.result, name)
+        if not callable(attribute):
+            return attribute
+        return lambda *args, **kwargs: self.watch.call(attribute, *args, **kwargs)
+
+def pop_option(args, option, default=None, cast=int):
+    if option in args:
+        position = args.index(option)
+        if position + 1 >= len(args):
+            print(f"Missing value for {option}")
+            sys.exit(1)
+        value = cast(args[position + 1])
+        del args[position:position + 2]
+        return value
+    return default
+
+class NodeNotFound(Exception):
+    pass
+
+def check_nodes(backend, tx, *node_names):
+    for node_name in node_names:
+        if not backend.node_exists(tx, node_name):
+            message = f"Node '{node_name}' does not exist in the database."
+            suggestions = backend.suggest_names(tx, node_name)
+            if suggestions:
+                message += f"\nDid you mean: {', '.join(suggestions)}?"
+            raise NodeNotFound(message)
+
+def require_nodes(backend, tx, *node_names):
+    try:
+        check_nodes(backend, tx, *node_names)
+    except NodeNotFound as e:
+        print(e)
+        sys.exit(1)
 
 def find_child_nodes(tx, start_node):
     query = (
@@ -18,27 +129,429 @@ def find_child_nodes(tx, start_node):
     result = tx.run(query, start_node=start_node)
     return [record["name"] for record in result]
 
-def find_paths_sync(driver, start_node, end_node, search_depth, root_node):
+# Stops a path search after `limit` paths or `timeout` seconds
+class PathBudget:
+    def __init__(self, limit=None, timeout=None):
+        self.limit = limit
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.found = 0
+        self.reason = None
+
+    def remaining_time(self):
+        if self.deadline is None:
+            return None
+        return max(0, self.deadline - time.monotonic())
+
+    # Counts one path; False once the search should stop
+    def record(self):
+        self.found += 1
+        if self.limit and self.found >= self.limit:
+            self.reason = f"limit of {self.limit} paths reached"
+        elif self.deadline is not None and time.monotonic() >= self.deadline:
+            self.timed_out()
+        return self.reason is None
+
+    def timed_out(self):
+        self.reason = f"timeout of {self.timeout} seconds reached"
+
+    # For searches that stop by themselves at the deadline
+    def check_deadline(self):
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.timed_out()
+
+# Goal 12 on the async driver: one Cypher expansion per child of the start
+# node, at most `max_in_flight` at a time. Branches hand their paths to a
+# small bounded queue; a branch that produces faster than the printer waits
+# its turn, so output interleaves branches in arrival order. Outstanding
+# branches are cancelled as soon as the budget is spent.
+def print_path(path):
+    print(f"Path: {path}\n")
+
+async def find_paths_concurrently(root_node, child_nodes, end_node, search_depth, budget, max_in_flight, emit=print_path):
+    from utils import get_async_driver
+    find_all_paths_async = neo4j_goals().find_all_paths_async
+    async_driver = get_async_driver()
+    semaphore = asyncio.Semaphore(max_in_flight)
+    paths = asyncio.Queue(maxsize=max_in_flight)
+
+    async def branch(child):
+        async with semaphore:
+            async with async_driver.session() as session, instrumented_async(session) as session:
+                async for path in find_all_paths_async(session, child, end_node, search_depth):
+                    await paths.put(path)
+
+    async def run_branches():
+        results = await asyncio.gather(*(branch(child) for child in child_nodes), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"An error occurred: {str(result)}")
+        await paths.put(None)
+
+    producer = asyncio.create_task(run_branches())
     try:
-        with driver.session() as session:
-            with session.begin_transaction() as tx:
-                total_paths = 0
-                for path in find_all_paths(tx, start_node, end_node, search_depth):
-                    path_str = ' --> '.join([str(node) for node in path])
-                    print(f"Path: {root_node} -->  {path}\n")
-                    total_paths += 1
-                return total_paths
-    except Exception as e:
-        print(f"An error occurred: {str(e)}")
-        return 0
+        while True:
+            path = await asyncio.wait_for(paths.get(), budget.remaining_time())
+            if path is None:
+                break
+            emit(f"{root_node} --> {path}")
+            if not budget.record():
+                break
+    except asyncio.TimeoutError:
+        budget.timed_out()
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+    return budget.found
+
+async def run_paths_goal(driver, graph, start_node, end_node, search_depth, use_pruned, budget, max_in_flight,
+                         emit=print_path, processes=None):
+    if graph is not None or use_pruned or processes:
+        # The searches stop at the deadline even between two paths, and Neo4j
+        # aborts a reverse BFS query that would run past it
+        timeout = budget.remaining_time()
+        with open_backend(driver, graph, timeout=max(timeout, 0.001) if timeout is not None else None) as (backend, tx):
+            require_nodes(backend, tx, start_node, end_node)
+            print("")
+            if processes:
+                paths = backend.find_all_paths_parallel(
+                    tx, start_node, end_node, search_depth, processes, budget.deadline
+                )
+            elif graph is not None:
+                paths = backend.find_all_paths(tx, start_node, end_node, search_depth, budget.deadline)
+            else:
+                paths = backend.find_all_paths_pruned(tx, start_node, end_node, search_depth, budget.deadline)
+            for path in paths:
+                emit(path)
+                if not budget.record():
+                    break
+            budget.check_deadline()
+        return budget.found
+
+    with open_backend(driver, None) as (backend, tx):
+        require_nodes(backend, tx, start_node, end_node)
+        child_nodes = find_child_nodes(tx, start_node)
+    print("")
+    return await find_paths_concurrently(
+        start_node, child_nodes, end_node, search_depth - 1, budget, max_in_flight, emit
+    )
+
+# Goal 12 written to `out_file` as a path trie or path DAG instead of printed
+async def write_paths_goal(driver, graph, start_node, end_node, search_depth, use_pruned, budget, max_in_flight,
+                           output_format, out_file, processes=None):
+    if output_format == "dag":
+        with open_backend(driver, graph) as (backend, tx):
+            require_nodes(backend, tx, start_node, end_node)
+            document = backend.find_path_dag(tx, start_node, end_node, search_depth)
+        summary = f"{len(document['names'])} nodes and {sum(map(len, document['children']))} relationships"
+    else:
+        trie = PathTrie()
+        await run_paths_goal(
+            driver, graph, start_node, end_node, search_depth, use_pruned, budget, max_in_flight,
+            lambda path: trie.add(path.split(" --> ")), processes,
+        )
+        document = trie.to_document()
+        summary = f"{trie.path_count} paths over {len(trie.names)} distinct nodes"
+    write_started = time.time()
+    write_document(document, out_file)
+    print(f"Wrote path {output_format} with {summary} to {out_file} "
+          f"({os.path.getsize(out_file)} bytes in {time.time() - write_started:.4f} seconds).")
+
+# Goal 19
+def shortest_path_lines(backend, tx, start_node, end_node, k=1, directed=True):
+    found = 0
+    for found, path in enumerate(backend.find_shortest_paths(tx, start_node, end_node, k, directed), 1):
+        yield f"Shortest Path {found}: {path}"
+    if found == 0:
+        yield f"No path from '{start_node}' to '{end_node}'" + ("." if directed else " in either direction.")
+
+# Goal 12 found nothing within its depth: the shortest path downwards, or
+# failing that the shortest one ignoring direction
+def fallback_path_lines(driver, graph, start_node, end_node):
+    with open_backend(driver, graph) as (backend, tx):
+        for path in backend.find_shortest_paths(tx, start_node, end_node):
+            yield f"One Shortest Path: {path}"
+            return
+        for path in backend.find_shortest_paths(tx, start_node, end_node, directed=False):
+            yield f"One Shortest Path (ignoring direction): {path}"
+
+def node_goal_lines(backend, tx, goal, node_name):
+    if goal == 1:
+        for child in backend.find_all_children(tx, node_name):
+            yield f"Child [{node_name}]: {child}"
+    elif goal == 2:
+        count = backend.count_all_children(tx, node_name)
+        yield f"Total children of '{node_name}': {count}"
+    elif goal == 3:
+        for grandchild in backend.find_all_grandchildren(tx, node_name):
+            yield f"Grandchild [{node_name}]: {grandchild}"
+    elif goal == 4:
+        for parent in backend.find_all_parents(tx, node_name):
+            yield f"Parent [{node_name}]: {parent}"
+    elif goal == 5:
+        count = backend.count_all_parents(tx, node_name)
+        yield f"Total parents of '{node_name}': {count}"
+    elif goal == 6:
+        for grandparent in backend.find_all_grandparents(tx, node_name):
+            yield f"Grandparent [{node_name}]: {grandparent}"
+
+def graph_goal_lines(backend, tx, goal, top=None):
+    if goal == 7:
+        count = backend.count_unique_nodes(tx)
+        yield f"Total unique nodes: {count}"
+    elif goal == 8:
+        for root in backend.find_root_node(tx):
+            yield f"Root node: {root}"
+    elif goal == 9:
+        for node in backend.find_nodes_with_most_children(tx, top):
+            yield f"Node with the most children: {node}"
+    elif goal == 10:
+        least_count = 0
+        for node in backend.find_nodes_with_least_children(tx):
+            yield f"Node with the least children: {node}"
+            least_count += 1
+        yield f"Count : {least_count}"
+
+def reach_goal_lines(backend, tx, goal, args):
+    if goal == 14:
+        ancestor, descendant = args
+        if backend.is_descendant(tx, ancestor, descendant):
+            yield f"'{descendant}' is a descendant of '{ancestor}'."
+        else:
+            yield f"'{descendant}' is not a descendant of '{ancestor}'."
+    elif goal == 15:
+        count = backend.count_all_descendants(tx, args[0])
+        yield f"Total descendants of '{args[0]}': {count}"
+    elif goal == 16:
+        count = backend.count_all_ancestors(tx, args[0])
+        yield f"Total ancestors of '{args[0]}': {count}"
+    elif goal == 17:
+        for descendant in backend.find_all_descendants(tx, args[0]):
+            yield f"Descendant [{args[0]}]: {descendant}"
+    elif goal == 18:
+        for ancestor in backend.find_all_ancestors(tx, args[0]):
+            yield f"Ancestor [{args[0]}]: {ancestor}"
+
+# Goals 20 and 21, streamed level by level with a count after each level
+def hop_goal_lines(backend, tx, goal, node_name, max_depth, level_limit=None):
+    if goal == 20:
+        label, found = "Descendant", backend.find_descendants_within(tx, node_name, max_depth, level_limit)
+    else:
+        label, found = "Ancestor", backend.find_ancestors_within(tx, node_name, max_depth, level_limit)
+    level, level_count, total = 1, 0, 0
+    for depth, name in chain(found, [(None, None)]):
+        if depth != level and level_count:
+            capped = " (level limit reached)" if level_count == level_limit else ""
+            yield f"Depth {level}: {level_count} nodes{capped}"
+            level, level_count = depth, 0
+        if depth is not None:
+            yield f"{label} [{node_name}] at depth {depth}: {name}"
+            level_count += 1
+            total += 1
+    yield f"Total {label.lower()}s of '{node_name}' within {max_depth} hops: {total}"
+
+def goal_lines(driver, graph, goal, args, top=None, watch=None):
+    with open_backend(driver, graph, watch) as (backend, tx):
+        if goal in NODE_GOALS:
+            check_nodes(backend, tx, args[0])
+            yield from node_goal_lines(backend, tx, goal, args[0])
+        elif goal in REACH_GOALS:
+            check_nodes(backend, tx, *args)
+            yield from reach_goal_lines(backend, tx, goal, args)
+        else:
+            yield from graph_goal_lines(backend, tx, goal, top)
+
+# Output of goals 1-10 plus whether it came from the result cache
+# (None when the goal is not cached)
+def cached_goal_lines(driver, graph, cache, goal, args, top=None):
+    if cache is None or goal not in CACHED_GOALS:
+        return None, goal_lines(driver, graph, goal, args, top)
+    lines, version = cache.get(goal, args)
+    if lines is not None:
+        return True, iter(lines)
+    watch = ErrorWatch()
+    return False, record_lines(cache, goal, args, version, watch, goal_lines(driver, graph, goal, args, top, watch))
+
+# Streams `output` and caches it under the version it was looked up at,
+# unless a query failed along the way
+def record_lines(cache, goal, args, version, watch, output):
+    lines = []
+    for line in output:
+        lines.append(line)
+        yield line
+    if not watch.failed:
+        cache.put(goal, args, version, lines)
 
-async def find_paths_async(driver, start_node, end_node, search_depth, root_node):
+def count_path_lines(backend, tx, start_node, end_node, search_depth):
+    histogram, exact = backend.count_all_paths(tx, start_node, end_node, search_depth)
+    if exact:
+        for length in sorted(histogram):
+            yield f"Paths of length {length}: {histogram[length]}"
+        yield f"Total Paths Found: {sum(histogram.values())}"
+        return
+    # Too many paths through a cycle to count one by one
+    for length in sorted(histogram):
+        yield f"Paths of length {length}: at most {histogram[length]}"
+    yield f"Total Paths Found: at most {sum(histogram.values())} (upper bound: walks around cycles are included)"
+
+def run_goal(driver, graph, cache, goal, args, top=None):
     try:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, find_paths_sync, driver, start_node, end_node, search_depth, root_node)
-    except Exception as e:
-        print(f"An error occurred: {str(e)}")
-        return 0
+        hit, output = cached_goal_lines(driver, graph, cache, goal, args, top)
+        for line in output:
+            print(line)
+    except NodeNotFound as e:
+        print(e)
+        sys.exit(1)
+    if hit is not None:
+        report_cache(cache, hit)
+
+BATCH_LINES = {
+    1: "Child [{name}]: {value}",
+    2: "Total children of '{name}': {value}",
+    3: "Grandchild [{name}]: {value}",
+    4: "Parent [{name}]: {value}",
+    5: "Total parents of '{name}': {value}",
+    6: "Grandparent [{name}]: {value}",
+}
+
+def read_node_names(source):
+    file = sys.stdin if source == "-" else open(source, encoding='utf-8')
+    try:
+        for line in file:
+            name = line.strip()
+            if name:
+                yield name
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+def chunked(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Goals 1-6 for every name in a file (or stdin), one UNWIND query per chunk,
+# printing results as they stream back
+def run_batch(driver, graph, goal, source, chunk_size=1000):
+    started = time.time()
+    total_nodes = 0
+    missing = 0
+    line_format = BATCH_LINES[goal]
+    with contextlib.ExitStack() as stack:
+        if graph is not None:
+            backend, tx = memory_goals, graph
+        else:
+            backend, tx = neo4j_goals(), stack.enter_context(instrumented(stack.enter_context(driver.session())))
+        for chunk in chunked(read_node_names(source), chunk_size):
+            for name, found, value in backend.batch_node_goal(tx, goal, chunk):
+                if not found:
+                    print(f"Node '{name}' does not exist in the database.")
+                    missing += 1
+                elif value is not None:
+                    print(line_format.format(name=name, value=value))
+            total_nodes += len(chunk)
+    elapsed = time.time() - started
+    print(f"Processed {total_nodes} nodes ({missing} missing) in {elapsed:.4f} seconds "
+          f"({total_nodes / elapsed if elapsed else 0:.0f} nodes/s).")
+
+# Goal 11 in bulk. The mapping file holds one old_name,new_name row per line,
+# quoted like the taxonomy dump
+def read_rename_rows(source):
+    file = sys.stdin if source == "-" else open(source, newline='', encoding='utf-8')
+    try:
+        reader = csv.reader(file, quotechar='"', escapechar='\\', doublequote=False)
+        for line_number, row in enumerate(reader, 1):
+            if row:
+                yield line_number, row
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+# Splits the mapping into rows to apply and (line, row, reason) rejections,
+# before anything is written: each name may be renamed and targeted once,
+# the old name must exist and the new one must not (the unique constraint)
+def validate_renames(backend, tx, numbered_rows):
+    accepted = []
+    rejected = []
+    old_names = {}
+    new_names = {}
+    for line_number, row in numbered_rows:
+        if len(row) != 2 or not row[0] or not row[1]:
+            rejected.append((line_number, row, "expected old_name,new_name"))
+        elif row[0] == row[1]:
+            rejected.append((line_number, row, "new name equals old name"))
+        elif row[0] in old_names:
+            rejected.append((line_number, row, f"'{row[0]}' is already renamed on line {old_names[row[0]]}"))
+        elif row[1] in new_names:
+            rejected.append((line_number, row, f"'{row[1]}' is already a target on line {new_names[row[1]]}"))
+        else:
+            old_names[row[0]] = new_names[row[1]] = line_number
+            accepted.append((line_number, row))
+
+    existing = backend.find_existing_names(tx, list(old_names) + list(new_names))
+    rows = []
+    for line_number, (old_name, new_name) in accepted:
+        if old_name not in existing:
+            rejected.append((line_number, [old_name, new_name], f"'{old_name}' does not exist"))
+        elif new_name in old_names:
+            # Chains and swaps would depend on the order rows are applied in
+            rejected.append((line_number, [old_name, new_name], f"'{new_name}' is itself renamed on line {old_names[new_name]}"))
+        elif new_name in existing:
+            rejected.append((line_number, [old_name, new_name], f"'{new_name}' already exists"))
+        else:
+            rows.append((line_number, {"old": old_name, "new": new_name}))
+    return rows, rejected
+
+def run_bulk_rename(driver, graph, source, chunk_size=1000, rejected_file=None):
+    started = time.time()
+    with open_backend(driver, graph) as (backend, tx):
+        rows, rejected = validate_renames(backend, tx, read_rename_rows(source))
+    renamed = 0
+    for chunk in chunked(rows, chunk_size):
+        failed = set()
+        try:
+            with open_backend(driver, graph) as (backend, tx):
+                applied = set(backend.rename_nodes(tx, [row for _, row in chunk]))
+        except Exception:
+            # Something changed since validation: apply the chunk row by row
+            # to find the rows that fail
+            applied = set()
+            for line_number, row in chunk:
+                try:
+                    with open_backend(driver, graph) as (backend, tx):
+                        applied.update(backend.rename_nodes(tx, [row]))
+                except Exception as e:
+                    rejected.append((line_number, [row["old"], row["new"]], str(e)))
+                    failed.add(row["old"])
+        renamed += len(applied)
+        # Old names deleted or renamed by someone else since validation
+        for line_number, row in chunk:
+            if row["old"] not in applied and row["old"] not in failed:
+                rejected.append((line_number, [row["old"], row["new"]], f"'{row['old']}' no longer exists"))
+    if graph is None and renamed:
+        invalidate_cache()
+
+    rejected.sort()
+    for line_number, row, reason in rejected:
+        print(f"Rejected line {line_number} {row}: {reason}")
+    if rejected_file is not None:
+        with open(rejected_file, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file, quotechar='"', escapechar='\\', doublequote=False)
+            for _, row, reason in rejected:
+                writer.writerow(row + [reason])
+        print(f"Rejected rows written to '{rejected_file}'.")
+    elapsed = time.time() - started
+    print(f"Renamed {renamed} nodes ({len(rejected)} rows rejected) in {elapsed:.4f} seconds "
+          f"({renamed / elapsed if elapsed else 0:.0f} renames/s).")
+
+def report_cache(cache, hit):
+    hits, misses = cache.stats()
+    print(f"Result cache {'hit' if hit else 'miss'} ({hits} hits, {misses} misses in total)")
 
 async def main():
     if len(sys.argv) < 2:
@@ -47,14 +560,57 @@ async def main():
 
     goal = int(sys.argv[1])
     args = sys.argv[2:]
+    use_memory = pop_flag(args, "--memory")
+    use_pruned = pop_flag(args, "--pruned")
+    count_only = pop_flag(args, "--count")
+    top = pop_option(args, "--top")
+    use_cache = not pop_flag(args, "--no-cache")
+    limit = pop_option(args, "--limit")
+    timeout = pop_option(args, "--timeout", cast=float)
+    max_in_flight = pop_option(args, "--max-in-flight", goal12_max_in_flight)
+    batch_source = pop_option(args, "--batch", cast=str)
+    chunk_size = pop_option(args, "--chunk-size", 1000)
+    rejected_file = pop_option(args, "--rejected", cast=str)
+    output_format = pop_option(args, "--format", cast=str)
+    out_file = pop_option(args, "--out", cast=str)
+    metrics_format = pop_option(args, "--metrics", cast=str)
+    metrics_file = pop_option(args, "--metrics-file", cast=str)
+    profile = pop_flag(args, "--profile")
+    fast_wipe = pop_flag(args, "--fast")
+    undirected = pop_flag(args, "--undirected")
+    wipe_threads = pop_option(args, "--threads", 4)
+    level_limit = pop_option(args, "--level-limit")
+    processes = pop_option(args, "--processes")
 
-    driver = get_driver()
+    if level_limit is not None and level_limit < 1:
+        print(f"--level-limit must be at least 1, got {level_limit}.")
+        sys.exit(1)
+    if metrics_format not in (None, "json", "prometheus"):
+        print(f"Unknown metrics format '{metrics_format}', expected json or prometheus.")
+        sys.exit(1)
+    if metrics_format or profile:
+        configure(metrics_format or "json", metrics_file, profile)
+        set_goal(goal)
+
+    driver = None
+    if not use_memory:
+        from utils import get_driver
+        driver = get_driver()
+    graph = None
+    if use_memory:
+        load_start = time.time()
+        graph = open_graph()
+        print(f"Loaded {graph.node_count} nodes and {graph.edge_count} relationships "
+              f"in {time.time() - load_start:.4f} seconds.")
+    # Results from the in-memory graph are already cheaper than a cache lookup
+    cache = ResultCache() if use_cache and graph is None else None
     start_time = time.time()
 
     try:
         if goal == 12:
             if len(args) < 2 or len(args) > 3:
-                print("Usage: dbcli 12 <start_node> <end_node> [search_depth]")
+                print("Usage: dbcli 12 <start_node> <end_node> [search_depth] [--pruned] [--count] "
+                      "[--limit N] [--timeout S] [--max-in-flight N] [--processes N] [--format trie|dag] [--out FILE]")
                 sys.exit(1)
             start_node = args[0]
             end_node = args[1]
@@ -65,109 +621,129 @@ async def main():
                 print("Operation aborted.")
                 sys.exit(1)
 
-            if search_depth > 10:
+            if output_format not in (None, "trie", "dag"):
+                print(f"Unknown output format '{output_format}', expected trie or dag.")
+                sys.exit(1)
+
+            # The DAG is built whole by two BFS passes, with no path search to
+            # cut short or spread over processes
+            dag_conflicts = [
+                option for option, value in (("--limit", limit), ("--timeout", timeout), ("--processes", processes))
+                if value is not None
+            ]
+            if output_format == "dag" and dag_conflicts:
+                print(f"--format dag cannot be combined with {', '.join(dag_conflicts)}.")
+                sys.exit(1)
+
+            if search_depth > 10 and not count_only and output_format != "dag":
                 confirm = input(f"Searching all paths at a depth of {search_depth} can be time-consuming.\nDo you want to continue? (Y/n): ")
-                start_time = time.time()
                 if confirm.lower() != 'y':
                     print("Operation aborted.")
                     sys.exit(1)
+                # The goal time, and goal_total in the metrics, leave out the prompt
+                start_time = time.time()
 
-            with driver.session() as session:
-                with session.begin_transaction() as tx:
-                    if not node_exists(tx, start_node):
-                        print(f"Node '{start_node}' does not exist in the database.")
-                        sys.exit(1)
-                    if not node_exists(tx, end_node):
-                        print(f"Node '{end_node}' does not exist in the database.")
-                        sys.exit(1)
-                    child_nodes = find_child_nodes(tx, start_node)
-
-            print("")
-            search_depth -= 1
-            tasks = [find_paths_async(driver, child, end_node, search_depth, start_node) for child in child_nodes]
-            total_paths = sum(await asyncio.gather(*tasks))
-            found_all_path_time = time.time()
-            if total_paths == 0:
-                print(f"No Paths found within search depth of {search_depth+1}.")
-                for shortest_path in find_shortest_path(driver, start_node, end_node):
-                    print(f"\nOne Shortest Path: {shortest_path}\n")
-            search_depth += 1
-            print(f"Total Paths Found: {total_paths}")
-            print(f"Search Depth: {search_depth}")
+            if count_only:
+                with open_backend(driver, graph) as (backend, tx):
+                    require_nodes(backend, tx, start_node, end_node)
+                    print("")
+                    for line in count_path_lines(backend, tx, start_node, end_node, search_depth):
+                        print(line)
+                print(f"Search Depth: {search_depth}")
+            elif output_format is not None:
+                budget = PathBudget(limit, timeout)
+                await write_paths_goal(
+                    driver, graph, start_node, end_node, search_depth, use_pruned, budget, max_in_flight,
+                    output_format, out_file or f"goal_12_paths.{output_format}.json", processes,
+                )
+                if budget.reason is not None:
+                    print(f"Search stopped early: {budget.reason}.")
+                print(f"Search Depth: {search_depth}")
+            else:
+                budget = PathBudget(limit, timeout)
+                total_paths = await run_paths_goal(
+                    driver, graph, start_node, end_node, search_depth, use_pruned, budget, max_in_flight,
+                    processes=processes,
+                )
+                if budget.reason is not None:
+                    print(f"Search stopped early: {budget.reason}.")
+                elif total_paths == 0:
+                    print(f"No Paths found within search depth of {search_depth}.")
+                    for line in fallback_path_lines(driver, graph, start_node, end_node):
+                        print(f"\n{line}\n")
+                print(f"Total Paths Found: {total_paths}")
+                print(f"Search Depth: {search_depth}")
 
             if len(args) == 2:
                 print(f"To increase Search Depth, Usage: dbcli 12 <start_node> <end_node> [search_depth]")
 
+        elif goal in NODE_GOALS and batch_source is not None:
+            run_batch(driver, graph, goal, batch_source, chunk_size)
+
+        elif goal in NODE_GOALS:
+            if len(args) != 1:
+                print(f"Usage: python dbcli.py {goal} <node_name> | --batch <file|-> [--chunk-size N]")
+                sys.exit(1)
+            run_goal(driver, graph, cache, goal, args)
+
+        elif goal in GRAPH_GOALS:
+            run_goal(driver, graph, cache, goal, args, top)
+
+        elif goal == 19:
+            if len(args) not in (2, 3):
+                print("Usage: python dbcli.py 19 <start_node> <end_node> [k] [--undirected]")
+                sys.exit(1)
+            k = int(args[2]) if len(args) == 3 else 1
+            with open_backend(driver, graph) as (backend, tx):
+                require_nodes(backend, tx, args[0], args[1])
+                for line in shortest_path_lines(backend, tx, args[0], args[1], k, not undirected):
+                    print(line)
+
+        elif goal in HOP_GOALS:
+            if len(args) != 2:
+                print(f"Usage: python dbcli.py {goal} <node_name> <max_depth> [--level-limit N]")
+                sys.exit(1)
+            with open_backend(driver, graph) as (backend, tx):
+                require_nodes(backend, tx, args[0])
+                for line in hop_goal_lines(backend, tx, goal, args[0], int(args[1]), level_limit):
+                    print(line)
+
+        elif goal in REACH_GOALS:
+            if len(args) != (2 if goal == 14 else 1):
+                usage = "<ancestor> <descendant>" if goal == 14 else "<node_name>"
+                print(f"Usage: python dbcli.py {goal} {usage}")
+                sys.exit(1)
+            run_goal(driver, graph, cache, goal, args)
+
+        elif goal == 11 and batch_source is not None:
+            run_bulk_rename(driver, graph, batch_source, chunk_size, rejected_file)
+
+        elif goal == 11:
+            if len(args) != 2:
+                print("Usage: python dbcli.py 11 <old_name> <new_name> | --batch <mapping.csv|-> [--chunk-size N] [--rejected FILE]")
+                sys.exit(1)
+            old_name, new_name = args
+            with open_backend(driver, graph) as (backend, tx):
+                success = backend.rename_node(tx, old_name, new_name)
+            if graph is None:
+                invalidate_cache()
+            if not success:
+                sys.exit(1)
+            print(f"Renamed node '{old_name}' to '{new_name}' successfully.")
+        elif goal == 13: #Deleting All Nodes from database
+            if graph is not None:
+                print("Goal 13 deletes the Neo4j database and is not available with --memory.")
+                sys.exit(1)
+            from utils import delete_all_fast, delete_all_nodes_in_batches
+            batch_size = int(args[0]) if args else 5000
+            if fast_wipe:
+                delete_all_fast(batch_size, wipe_threads)
+            else:
+                delete_all_nodes_in_batches(batch_size, 3, 3)
+            invalidate_cache()
         else:
-            with driver.session() as session:
-                node_goals = [1,2,3,4,5,6]
-
-                if goal in node_goals:
-                    if len(args) != 1:
-                        print(f"Usage: python dbcli.py {goal} <node_name>")
-                        sys.exit(1)
-                    node_name = args[0]
-                    with session.begin_transaction() as tx:
-                        if not node_exists(tx, node_name):
-                            print(f"Node '{node_name}' does not exist in the database.")
-                            sys.exit(1)
-
-                        if goal == 1:
-                            for child in find_all_children(tx, node_name):
-                                print(f"Child [{node_name}]: {child}")
-
-                        elif goal == 2:
-                            count = count_all_children(tx, node_name)
-                            print(f"Total children of '{node_name}':", count)
-
-                        elif goal == 3:
-                            for grandchild in find_all_grandchildren(tx, node_name):
-                                print(f"Grandchild [{node_name}]: {grandchild}")
-
-                        elif goal == 4:
-                            for parent in find_all_parents(tx, node_name):
-                                print(f"Parent [{node_name}]: {parent}")
-
-                        elif goal == 5:
-                            count = count_all_parents(tx, node_name)
-                            print(f"Total parents of '{node_name}':", count)
-                        elif goal == 6:
-                            for grandparent in find_all_grandparents(tx, node_name):
-                                print(f"Grandparent [{node_name}]: {grandparent}")
-
-                elif goal == 7:
-                    with session.begin_transaction() as tx:
-                        count = count_unique_nodes(tx)
-                        print("Total unique nodes:", count)
-                elif goal == 8:
-                    with session.begin_transaction() as tx:
-                        for root in find_root_node(tx):
-                            print("Root node:", root)
-                elif goal == 9:
-                    with session.begin_transaction() as tx:
-                        for node in find_nodes_with_most_children(tx):
-                            print("Node with the most children:", node)
-                elif goal == 10:
-                    least_count = 0
-                    with session.begin_transaction() as tx:
-                        for node in find_nodes_with_least_children(tx):
-                            print("Node with the least children:", node)
-                            least_count += 1
-                        print(f"Count : {least_count}")
-                elif goal == 11:
-                    if len(args) != 2:
-                        print("Usage: python dbcli.py 11 <old_name> <new_name>")
-                        sys.exit(1)
-                    old_name, new_name = args
-                    success = rename_node(session, old_name, new_name)
-                    if success:
-                        print(f"Renamed node '{old_name}' to '{new_name}' successfully.")
-                elif goal == 13: #Deleting All Nodes from database
-                    batch_size = int(args[0]) if args else 5000
-                    delete_all_nodes_in_batches(batch_size, 3, 3)
-                else:
-                    print("Invalid goal number")
-                    sys.exit(1)
+            print("Invalid goal number")
+            sys.exit(1)
 
     except Exception as e:
         print(f"An error occurred: {str(e)}")
@@ -175,8 +751,15 @@ async def main():
     end_time = time.time()
     execution_time = end_time - start_time
     print(f"Goal {goal} executed in {execution_time:.4f} seconds.")
+    record_batch("goal_total", execution_time, 0)
+    close_metrics()
 
-    close_driver()
+    if cache is not None:
+        cache.close()
+    if driver is not None:
+        from utils import close_driver, close_async_driver
+        close_driver()
+        await close_async_driver()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,80 @@
+import heapq
+from array import array
+
+# Materialized degree statistics for goals 8, 9 and 10.
+#
+# Degrees come straight from the CSR offset arrays. On top of them the index
+# keeps the root list (in-degree 0), the `capacity` nodes with the most
+# children as a min-heap, and the bucket of nodes with the smallest non-zero
+# child count, so each goal reads its answer instead of scanning the graph.
+# Everything is keyed by node id and names are resolved when answering, so a
+# rename needs no update here.
+
+
+class DegreeIndex:
+    def __init__(self, graph, roots, top, min_degree, min_bucket, capacity=100):
+        self.graph = graph
+        self.capacity = capacity
+        self.roots = dict.fromkeys(roots)
+        self.top = [(graph.out_degree(node_id), node_id) for node_id in top]
+        heapq.heapify(self.top)
+        self.min_degree = min_degree
+        self.min_bucket = dict.fromkeys(min_bucket)
+
+    @classmethod
+    def build(cls, graph, capacity=100):
+        roots = []
+        min_degree = 0
+        min_bucket = []
+        degrees = []
+        for node_id in range(graph.node_count):
+            if graph.in_degree(node_id) == 0:
+                roots.append(node_id)
+            count = graph.out_degree(node_id)
+            if count == 0:
+                continue
+            degrees.append((count, node_id))
+            if min_degree == 0 or count < min_degree:
+                min_degree = count
+                min_bucket = [node_id]
+            elif count == min_degree:
+                min_bucket.append(node_id)
+        top = [node_id for _, node_id in heapq.nlargest(capacity, degrees)]
+        return cls(graph, roots, top, min_degree, min_bucket, capacity)
+
+    def root_ids(self):
+        return list(self.roots)
+
+    # The k nodes with the most children, largest first, as (count, node id);
+    # k=None returns every node tied for the largest count. The heap answers
+    # unless the request reaches past it, then the degrees are scanned.
+    def most_children(self, k=None):
+        ranked = sorted(self.top, key=lambda entry: (-entry[0], entry[1]))
+        complete = len(ranked) < self.capacity
+        if k is None:
+            if not ranked:
+                return []
+            tied = [entry for entry in ranked if entry[0] == ranked[0][0]]
+            if len(tied) < len(ranked) or complete:
+                return tied
+            return [(count, node_id) for count, node_id in self._all_degrees() if count == ranked[0][0]]
+        if k <= len(ranked) or complete:
+            return ranked[:k]
+        return sorted(heapq.nlargest(k, self._all_degrees()), key=lambda entry: (-entry[0], entry[1]))
+
+    # Nodes with at least one child, as the Neo4j query sees them
+    def _all_degrees(self):
+        for node_id in range(self.graph.node_count):
+            count = self.graph.out_degree(node_id)
+            if count > 0:
+                yield count, node_id
+
+    def least_children(self):
+        return self.min_degree, list(self.min_bucket)
+
+    def to_arrays(self):
+        return (
+            array('i', self.roots),
+            array('i', (node_id for _, node_id in self.top)),
+            array('i', self.min_bucket),
+        )
@@ -0,0 +1,166 @@
+import heapq
+import json
+import os
+import sys
+import tempfile
+import time
+from csr_graph import read_edges
+from import_data import run_batch_pipeline, import_batch
+from instrumentation import recorded_batches
+from result_cache import invalidate_cache
+from utils import get_driver, close_driver, process_removal_batch, process_orphan_batch
+
+# Delta sync between two taxonomy dumps: brings a database loaded from
+# `old_file` to the state a full import of `new_file` would produce, writing
+# only the relationships that changed.
+#
+# Both dumps are sorted externally: edges are read in runs of `run_size`,
+# each run is sorted and spilled to a temporary file, and the runs are merged
+# back with heapq.merge, so memory stays at one run per dump. A merge-join of
+# the two sorted streams writes the removed and added edges to two more files,
+# which are then applied in batches: removals first, then additions (MERGE, as
+# in the full import), and finally categories left without any relationship
+# are deleted, since a full import would not have created them.
+#
+# Usage: python delta_sync.py <old_file> <new_file> [--batch-size N]
+#                             [--threads N] [--dry-run]
+
+
+def write_sorted_runs(file_path, work_dir, run_size=1000000):
+    runs = []
+    edges = read_edges(file_path)
+    while True:
+        run = sorted(set(edge for _, edge in zip(range(run_size), edges)))
+        if not run:
+            return runs
+        run_path = os.path.join(work_dir, f"run-{len(os.listdir(work_dir))}.jsonl")
+        with open(run_path, 'w', encoding='utf-8') as file:
+            for edge in run:
+                file.write(json.dumps(edge) + "\n")
+        runs.append(run_path)
+
+
+def read_run(run_path):
+    with open(run_path, encoding='utf-8') as file:
+        for line in file:
+            yield tuple(json.loads(line))
+
+
+# Every distinct edge of `file_path`, in sorted order
+def sorted_edges(file_path, work_dir, run_size=1000000):
+    previous = None
+    for edge in heapq.merge(*(read_run(run) for run in write_sorted_runs(file_path, work_dir, run_size))):
+        if edge != previous:
+            yield edge
+            previous = edge
+
+
+# Merge-join of two sorted, distinct edge streams: yields ("removed", edge)
+# for edges only in `old_edges` and ("added", edge) for edges only in `new_edges`
+def diff_edges(old_edges, new_edges):
+    old_edge = next(old_edges, None)
+    new_edge = next(new_edges, None)
+    while old_edge is not None or new_edge is not None:
+        if new_edge is None or (old_edge is not None and old_edge < new_edge):
+            yield "removed", old_edge
+            old_edge = next(old_edges, None)
+        elif old_edge is None or new_edge < old_edge:
+            yield "added", new_edge
+            new_edge = next(new_edges, None)
+        else:
+            old_edge = next(old_edges, None)
+            new_edge = next(new_edges, None)
+
+
+def write_delta(old_file, new_file, work_dir, run_size=1000000):
+    paths = {change: os.path.join(work_dir, f"{change}.jsonl") for change in ("removed", "added")}
+    counts = dict.fromkeys(paths, 0)
+    old_dir = tempfile.mkdtemp(dir=work_dir)
+    new_dir = tempfile.mkdtemp(dir=work_dir)
+    with open(paths["removed"], 'w', encoding='utf-8') as removed, open(paths["added"], 'w', encoding='utf-8') as added:
+        files = {"removed": removed, "added": added}
+        for change, (category, subcategory) in diff_edges(
+            sorted_edges(old_file, old_dir, run_size), sorted_edges(new_file, new_dir, run_size)
+        ):
+            files[change].write(json.dumps({"category": category, "subcategory": subcategory}) + "\n")
+            counts[change] += 1
+    return paths, counts
+
+
+# (batch, bytes consumed) pairs from a delta file, for run_batch_pipeline
+def read_delta_batches(path, batch_size=10000):
+    with open(path, 'rb') as file:
+        batch = []
+        position = 0
+        for line in file:
+            batch.append(json.loads(line))
+            position += len(line)
+            if len(batch) == batch_size:
+                yield batch, position
+                batch = []
+        if batch:
+            yield batch, position
+
+
+def read_orphan_candidates(path):
+    candidates = set()
+    for batch, _ in read_delta_batches(path):
+        for row in batch:
+            candidates.add(row["category"])
+            candidates.add(row["subcategory"])
+    return sorted(candidates)
+
+
+def delta_sync(old_file, new_file, batch_size=10000, num_threads=4, dry_run=False, run_size=1000000):
+    start_time = time.time()
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths, counts = write_delta(old_file, new_file, work_dir, run_size)
+        print(f"Delta computed in {time.time() - start_time:.4f} seconds: "
+              f"{counts['removed']} relationships removed, {counts['added']} added.")
+        if dry_run or not any(counts.values()):
+            return counts
+
+        get_driver()
+        try:
+            apply_start = time.time()
+            run_batch_pipeline(
+                read_delta_batches(paths["removed"], batch_size), recorded_batches("delta_remove", process_removal_batch),
+                os.path.getsize(paths["removed"]), num_threads, desc="Removing relationships"
+            )
+            run_batch_pipeline(
+                read_delta_batches(paths["added"], batch_size), recorded_batches("delta_add", import_batch),
+                os.path.getsize(paths["added"]), num_threads, desc="Adding relationships"
+            )
+            candidates = read_orphan_candidates(paths["removed"])
+            orphans = run_batch_pipeline(
+                ((candidates[i:i + batch_size], i + batch_size) for i in range(0, len(candidates), batch_size)),
+                recorded_batches("delta_orphans", process_orphan_batch), len(candidates), num_threads,
+                desc="Deleting orphaned categories"
+            )
+            changes = counts["removed"] + counts["added"]
+            apply_time = time.time() - apply_start
+            print(f"Applied {changes} relationship changes and deleted {orphans} orphaned categories "
+                  f"in {apply_time:.4f} seconds ({changes / apply_time if apply_time else 0:.0f} rows/s).")
+        finally:
+            close_driver()
+            invalidate_cache()
+
+    print(f"Delta sync executed in {time.time() - start_time:.4f} seconds.")
+    return counts
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    dry_run = "--dry-run" in args
+    if dry_run:
+        args.remove("--dry-run")
+    options = {"--batch-size": 10000, "--threads": 4}
+    for option in options:
+        if option in args:
+            position = args.index(option)
+            options[option] = int(args[position + 1])
+            del args[position:position + 2]
+    if len(args) != 2:
+        print("Usage: python delta_sync.py <old_file> <new_file> [--batch-size N] [--threads N] [--dry-run]")
+        sys.exit(1)
+    delta_sync(args[0], args[1], options["--batch-size"], options["--threads"], dry_run)
@@ -1,4 +1,9 @@
-import sys
+from itertools import chain
+from path_search import find_paths, count_paths_by_length, expand_levels
+from path_output import build_path_dag
+from parallel_paths import find_paths_parallel
+from shortest_paths import k_shortest_paths
+from utils import node_exists, suggest_names
 
 # Goal 8
 def find_root_node(tx):
@@ -15,16 +20,30 @@ def find_root_node(tx):
         print(f"An error occurred: {str(e)}")
 
 # Goal 9
-def find_nodes_with_most_children(tx):
+# Every node tied for the most children, or the `top` nodes with the most children
+def find_nodes_with_most_children(tx, top=None):
     try:
-        query = (
-            "MATCH (c:Category)-[:HAS_SUBCATEGORY]->(child) "
-            "WITH c, COUNT(child) AS children_count "
-            "ORDER BY children_count DESC "
-            "LIMIT 1 "
-            "RETURN c.name AS parent, children_count"
-        )
-        result = tx.run(query)
+        if top is None:
+            query = (
+                "MATCH (c:Category)-[:HAS_SUBCATEGORY]->(child) "
+                "WITH c, COUNT(child) AS children_count "
+                "WITH MAX(children_count) AS max_children_count "
+                "MATCH (c:Category)-[:HAS_SUBCATEGORY]->(child) "
+                "WITH c, COUNT(child) AS children_count, max_children_count "
+                "WHERE children_count = max_children_count "
+                "RETURN c.name AS parent "
+                "ORDER BY parent"
+            )
+            result = tx.run(query)
+        else:
+            query = (
+                "MATCH (c:Category)-[:HAS_SUBCATEGORY]->(child) "
+                "WITH c, COUNT(child) AS children_count "
+                "ORDER BY children_count DESC, c.name "
+                "LIMIT $top "
+                "RETURN c.name AS parent, children_count"
+            )
+            result = tx.run(query, top=top)
         for record in result:
             yield record["parent"]
     except Exception as e:
@@ -53,24 +72,46 @@ def find_nodes_with_least_children(tx):
 # Goal 11
 def rename_node(tx, old_name, new_name):
     try:
-        # Check if the node with old_name exists
-        check_query = "MATCH (c:Category {name: $old_name}) RETURN c"
-        result = tx.run(check_query, old_name=old_name)
-
-        if not result.peek():
-            # If the node doesn't exist, print a message and return
+        query = (
+            "MATCH (c:Category {name: $old_name}) "
+            "SET c.name = $new_name "
+            "RETURN count(c) AS renamed"
+        )
+        result = tx.run(query, old_name=old_name, new_name=new_name)
+        if result.single()["renamed"] == 0:
             print(f"Node with name '{old_name}' does not exist.")
-            sys.exit(1)
             return False
-
-        # If the node exists, rename it
-        rename_query = "MATCH (c:Category {name: $old_name}) SET c.name = $new_name"
-        tx.run(rename_query, old_name=old_name, new_name=new_name)
         return True
     except Exception as e:
         print(f"An error occurred: {str(e)}")
         return False
 
+# Goal 11 in bulk: the subset of `node_names` that exists
+def find_existing_names(tx, node_names, chunk_size=5000):
+    query = (
+        "UNWIND $node_names AS name "
+        "MATCH (c:Category {name: name}) "
+        "RETURN name"
+    )
+    existing = set()
+    for i in range(0, len(node_names), chunk_size):
+        result = tx.run(query, node_names=node_names[i:i + chunk_size])
+        existing.update(record["name"] for record in result)
+    return existing
+
+# Goal 11 in bulk: renames [{"old": ..., "new": ...}] rows in one query and
+# returns the old names that were found and renamed. Errors such as
+# unique-constraint violations are raised, not printed, so the caller can
+# roll the chunk back and find the offending row.
+def rename_nodes(tx, rows):
+    query = (
+        "UNWIND $rows AS row "
+        "MATCH (c:Category {name: row.old}) "
+        "SET c.name = row.new "
+        "RETURN row.old AS old"
+    )
+    return [record["old"] for record in tx.run(query, rows=rows)]
+
 # Goal 12
 def find_all_paths(tx, start_node, end_node, search_depth):
     try:
@@ -86,6 +127,74 @@ def find_all_paths(tx, start_node, end_node, search_depth):
     except Exception as e:
         print(f"An error occurred: {str(e)}")
 
+# Goal 12 on the async driver: streams paths as records arrive
+async def find_all_paths_async(session, start_node, end_node, search_depth):
+    query = (
+        f"MATCH p=(start:Category {{name: $start_node}})-[:HAS_SUBCATEGORY*..{search_depth}]->(end:Category {{name: $end_node}}) "
+        "RETURN p"
+    )
+    result = await session.run(query, start_node=start_node, end_node=end_node)
+    async for record in result:
+        path = record["p"]
+        yield " --> ".join(node["name"] for node in path.nodes)
+
+# Goal 12, reachability-pruned: one reverse BFS query per depth level from
+# end_node, then a local DFS that only enters nodes that can still reach it
+def find_all_paths_pruned(tx, start_node, end_node, search_depth, deadline=None):
+    try:
+        fetch_parents = lambda frontier: find_parent_edges(tx, frontier)
+        for path in find_paths(fetch_parents, start_node, end_node, search_depth, deadline):
+            yield " --> ".join(path)
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+# Goal 12, reachability-pruned, with the DFS spread over `processes` worker
+# processes (see parallel_paths.py); paths arrive in no fixed order
+def find_all_paths_parallel(tx, start_node, end_node, search_depth, processes=None, deadline=None):
+    try:
+        fetch_parents = lambda frontier: find_parent_edges(tx, frontier)
+        for path in find_paths_parallel(fetch_parents, start_node, end_node, search_depth, processes, deadline=deadline):
+            yield " --> ".join(path)
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+# Goal 12, count only: ({path length: number of paths}, exact), see
+# path_search.count_paths_by_length
+def count_all_paths(tx, start_node, end_node, search_depth):
+    try:
+        fetch_parents = lambda frontier: find_parent_edges(tx, frontier)
+        return count_paths_by_length(fetch_parents, start_node, end_node, search_depth)
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+        return {}, True
+
+# Goal 12 as a compact path DAG (see path_output.py)
+def find_path_dag(tx, start_node, end_node, search_depth):
+    fetch_parents = lambda frontier: find_parent_edges(tx, frontier)
+    return build_path_dag(fetch_parents, start_node, end_node, search_depth)
+
+def find_child_edges(tx, node_names, chunk_size=5000):
+    query = (
+        "UNWIND $node_names AS name "
+        "MATCH (c:Category {name: name})-[:HAS_SUBCATEGORY]->(child:Category) "
+        "RETURN name AS parent, child.name AS child"
+    )
+    for i in range(0, len(node_names), chunk_size):
+        result = tx.run(query, node_names=node_names[i:i + chunk_size])
+        for record in result:
+            yield record["parent"], record["child"]
+
+def find_parent_edges(tx, node_names, chunk_size=5000):
+    query = (
+        "UNWIND $node_names AS name "
+        "MATCH (parent:Category)-[:HAS_SUBCATEGORY]->(c:Category {name: name}) "
+        "RETURN parent.name AS parent, name AS child"
+    )
+    for i in range(0, len(node_names), chunk_size):
+        result = tx.run(query, node_names=node_names[i:i + chunk_size])
+        for record in result:
+            yield record["parent"], record["child"]
+
 # Goal 1
 def find_all_children(tx, node_name):
     try:
@@ -164,6 +273,173 @@ def find_all_grandparents(tx, node_name):
     except Exception as e:
         print(f"An error occurred: {str(e)}")
 
+# Goals 1-6 for many nodes in one round-trip. Every query yields
+# (name, found, value) rows; value is None for a node without neighbours.
+BATCH_QUERIES = {
+    1: (
+        "UNWIND $node_names AS name "
+        "OPTIONAL MATCH (c:Category {name: name}) "
+        "OPTIONAL MATCH (c)-[:HAS_SUBCATEGORY]->(child) "
+        "RETURN name, c IS NOT NULL AS found, child.name AS value"
+    ),
+    2: (
+        "UNWIND $node_names AS name "
+        "OPTIONAL MATCH (c:Category {name: name}) "
+        "OPTIONAL MATCH (c)-[:HAS_SUBCATEGORY]->(child) "
+        "RETURN name, c IS NOT NULL AS found, COUNT(child) AS value"
+    ),
+    3: (
+        "UNWIND $node_names AS name "
+        "OPTIONAL MATCH (c:Category {name: name}) "
+        "OPTIONAL MATCH (c)-[:HAS_SUBCATEGORY]->(:Category)-[:HAS_SUBCATEGORY]->(grandchild) "
+        "RETURN name, c IS NOT NULL AS found, grandchild.name AS value"
+    ),
+    4: (
+        "UNWIND $node_names AS name "
+        "OPTIONAL MATCH (c:Category {name: name}) "
+        "OPTIONAL MATCH (c)<-[:HAS_SUBCATEGORY]-(parent) "
+        "RETURN name, c IS NOT NULL AS found, parent.name AS value"
+    ),
+    5: (
+        "UNWIND $node_names AS name "
+        "OPTIONAL MATCH (c:Category {name: name}) "
+        "OPTIONAL MATCH (c)<-[:HAS_SUBCATEGORY]-(parent) "
+        "RETURN name, c IS NOT NULL AS found, COUNT(parent) AS value"
+    ),
+    6: (
+        "UNWIND $node_names AS name "
+        "OPTIONAL MATCH (c:Category {name: name}) "
+        "OPTIONAL MATCH (c)<-[:HAS_SUBCATEGORY]-(:Category)<-[:HAS_SUBCATEGORY]-(grandparent) "
+        "RETURN name, c IS NOT NULL AS found, grandparent.name AS value"
+    ),
+}
+
+def batch_node_goal(tx, goal, node_names):
+    result = tx.run(BATCH_QUERIES[goal], node_names=list(dict.fromkeys(node_names)))
+    for record in result:
+        yield record["name"], record["found"], record["value"]
+
+# Goal 14. Without the in-process reachability index these are unbounded
+# expansions; use --memory on large graphs
+def is_descendant(tx, ancestor, descendant):
+    try:
+        query = (
+            "MATCH (a:Category {name: $ancestor}), (d:Category {name: $descendant}) "
+            "WHERE (a)-[:HAS_SUBCATEGORY*]->(d) "
+            "RETURN count(*) > 0 AS reachable"
+        )
+        result = tx.run(query, ancestor=ancestor, descendant=descendant)
+        return result.single()["reachable"]
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+# Goal 15
+def count_all_descendants(tx, node_name):
+    try:
+        query = (
+            "MATCH (c:Category {name: $node_name})-[:HAS_SUBCATEGORY*]->(d) "
+            "WHERE d <> c "
+            "RETURN count(DISTINCT d) AS count"
+        )
+        result = tx.run(query, node_name=node_name)
+        return result.single()["count"]
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+# Goal 16
+def count_all_ancestors(tx, node_name):
+    try:
+        query = (
+            "MATCH (c:Category {name: $node_name})<-[:HAS_SUBCATEGORY*]-(a) "
+            "WHERE a <> c "
+            "RETURN count(DISTINCT a) AS count"
+        )
+        result = tx.run(query, node_name=node_name)
+        return result.single()["count"]
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+# Goal 17
+def find_all_descendants(tx, node_name):
+    try:
+        query = (
+            "MATCH (c:Category {name: $node_name})-[:HAS_SUBCATEGORY*]->(d) "
+            "WHERE d <> c "
+            "RETURN DISTINCT d.name AS name"
+        )
+        result = tx.run(query, node_name=node_name)
+        for record in result:
+            yield record["name"]
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+# Goal 18
+def find_all_ancestors(tx, node_name):
+    try:
+        query = (
+            "MATCH (c:Category {name: $node_name})<-[:HAS_SUBCATEGORY*]-(a) "
+            "WHERE a <> c "
+            "RETURN DISTINCT a.name AS name"
+        )
+        result = tx.run(query, node_name=node_name)
+        for record in result:
+            yield record["name"]
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+# Goal 20: (depth, name) for every descendant within `max_depth` hops, one
+# query per level (see path_search.expand_levels)
+def find_descendants_within(tx, node_name, max_depth, level_limit=None):
+    try:
+        for depth, name in expand_levels(level_fetcher(tx, True), node_name, max_depth, level_limit):
+            yield depth, name
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+# Goal 21
+def find_ancestors_within(tx, node_name, max_depth, level_limit=None):
+    try:
+        for depth, name in expand_levels(level_fetcher(tx, False), node_name, max_depth, level_limit):
+            yield depth, name
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+def level_fetcher(tx, downwards):
+    def fetch(frontier, visited, limit):
+        if limit is not None:
+            return find_new_neighbours(tx, frontier, visited, limit, downwards)
+        if downwards:
+            return (child for _, child in find_child_edges(tx, frontier))
+        return (parent for parent, _ in find_parent_edges(tx, frontier))
+    return fetch
+
+# Up to `limit` distinct children (or parents) of `node_names` that are not
+# in `visited`, for a level under --level-limit. `visited` is re-read before
+# each chunk, so it already holds what earlier chunks returned, and the
+# remaining limit goes into the query: the server never sends more rows
+# than the level can still take. `visited` stays small, at most
+# level_limit nodes per level.
+def find_new_neighbours(tx, node_names, visited, limit, downwards, chunk_size=5000):
+    pattern = (
+        "(c:Category {name: name})-[:HAS_SUBCATEGORY]->(n:Category)" if downwards
+        else "(n:Category)-[:HAS_SUBCATEGORY]->(c:Category {name: name})"
+    )
+    query = (
+        "UNWIND $node_names AS name "
+        f"MATCH {pattern} "
+        "WHERE NOT n.name IN $visited "
+        "RETURN DISTINCT n.name AS name "
+        "LIMIT $remaining"
+    )
+    remaining = limit
+    for i in range(0, len(node_names), chunk_size):
+        if remaining <= 0:
+            return
+        result = tx.run(query, node_names=node_names[i:i + chunk_size], visited=list(visited), remaining=remaining)
+        for record in result:
+            remaining -= 1
+            yield record["name"]
+
 # Goal 7
 def count_unique_nodes(tx):
     try:
@@ -178,19 +454,18 @@ def count_unique_nodes(tx):
         return 0
 
 
-# Helper function to find one shortest path
-def find_shortest_path(driver, start_node, end_node):
+# Goal 19 and the goal 12 fallback: the k shortest loopless paths, following
+# relationships downwards, or in either direction with directed=False. One
+# query per BFS level and side, see shortest_paths.py
+def find_shortest_paths(tx, start_node, end_node, k=1, directed=True):
     try:
-        with driver.session() as session:
-            result = session.run(
-                "MATCH path = ShortestPath((start:Category {name: $start_node})-[:HAS_SUBCATEGORY*]-(end:Category {name: $end_node})) "
-                "RETURN path",
-                start_node=start_node, end_node=end_node
-            )
-            for record in result:
-                path = record["path"]
-                nodes = [node["name"] for node in path.nodes]
-                yield " --> ".join(nodes)
+        children = lambda frontier: find_child_edges(tx, list(frontier))
+        parents = lambda frontier: ((child, parent) for parent, child in find_parent_edges(tx, list(frontier)))
+        if directed:
+            forward, backward = children, parents
+        else:
+            forward = backward = lambda frontier: chain(children(frontier), parents(frontier))
+        for path in k_shortest_paths(forward, backward, start_node, end_node, k):
+            yield " --> ".join(path)
     except Exception as e:
         print(f"An error occurred: {str(e)}")
-
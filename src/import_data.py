@@ -5,10 +5,19 @@ import os
 import sys
 import io
 import contextlib
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import queue
+import threading
+import tempfile
 from neo4j.exceptions import TransientError
-from utils import get_driver, close_driver, create_unique_constraint, process_batch, create_index
+from utils import (
+    get_driver, close_driver, create_unique_constraint, process_batch, create_index,
+    process_node_batch, process_relationship_batch
+)
 from tqdm import tqdm
+from config import data_file
+from result_cache import invalidate_cache
+from parallel_csv import stream_parsed_batches
+from instrumentation import configure, close_metrics, record_batch, recorded_batches
 
 class StderrFilter(io.StringIO):
     def write(self, msg):
@@ -24,52 +33,213 @@ def suppress_specific_warnings():
     finally:
         sys.stderr = old_stderr
 
-def decompress_file(file_path):
-    if file_path.endswith('.gz'):
-        decompressed_file_path = file_path[:-3]
-        with gzip.open(file_path, 'rb') as f_in, open(decompressed_file_path, 'wb') as f_out:
-            total_size = os.path.getsize(file_path)
-            with tqdm(total=total_size, unit='B', unit_scale=True, desc="Decompressing") as pbar:
+# The parallel parser needs byte offsets into the plain CSV, so a gzip dump
+# is decompressed into a temporary file next to it, which is removed again on
+# exit. Nothing beside the dump is ever overwritten.
+@contextlib.contextmanager
+def decompressed_file(file_path):
+    if not file_path.endswith('.gz'):
+        yield file_path
+        return
+    f_out = tempfile.NamedTemporaryFile(
+        suffix='.csv', prefix='.import-', dir=os.path.dirname(os.path.abspath(file_path)), delete=False
+    )
+    try:
+        with gzip.open(file_path, 'rb') as f_in, f_out:
+            with tqdm(total=os.path.getsize(file_path), unit='B', unit_scale=True, desc="Decompressing") as pbar:
                 for chunk in iter(lambda: f_in.read(1024 * 1024), b''):
                     f_out.write(chunk)
-                    pbar.update(len(chunk))
-        return decompressed_file_path
-    else:
-        return file_path
-
-def read_csv_in_batches(file_path, batch_size=10000):
-    batches = []
-    with open(file_path, 'r', newline='', encoding='utf-8', buffering=10*1024*1024) as file:
-        reader = csv.reader(file, quotechar='"', escapechar='\\', doublequote=False)
-        batch = []
-        for row in tqdm(reader, desc="Reading rows"):
-            if len(row) == 2:
-                category, subcategory = row
-                batch.append({"category": category, "subcategory": subcategory})
-                if len(batch) == batch_size:
-                    batches.append(batch)
-                    batch = []
-        if batch:
-            batches.append(batch)
-    return batches
+                    pbar.update(f_in.fileobj.tell() - pbar.n)
+        yield f_out.name
+    finally:
+        os.remove(f_out.name)
+
+# Reads the gzip directly (no decompressed copy on disk) and yields each batch
+# together with the number of compressed bytes consumed so far.
+def stream_csv_batches(file_path, batch_size=10000):
+    with open(file_path, 'rb', buffering=1024*1024) as raw:
+        stream = gzip.GzipFile(fileobj=raw) if file_path.endswith('.gz') else raw
+        with io.TextIOWrapper(stream, encoding='utf-8', newline='') as file:
+            reader = csv.reader(file, quotechar='"', escapechar='\\', doublequote=False)
+            batch = []
+            for row in reader:
+                if len(row) == 2:
+                    category, subcategory = row
+                    batch.append({"category": category, "subcategory": subcategory})
+                    if len(batch) == batch_size:
+                        yield batch, raw.tell()
+                        batch = []
+            if batch:
+                yield batch, raw.tell()
+
+# Feeds batches to the workers through a bounded queue: the reader blocks once
+# `queue_depth` batches are waiting, so at most queue_depth + num_threads + 1
+# batches are ever held in memory, whatever the size of the dump.
+# `batches` yields (batch, bytes consumed) pairs as produced by stream_csv_batches.
+def run_batch_pipeline(batches, handle_batch, total_size, num_threads=4, queue_depth=None, desc="Importing Data to Neo4j"):
+    work = queue.Queue(maxsize=queue_depth or num_threads)
+    lock = threading.Lock()
+    totals = {"records": 0}
+    errors = []
+
+    def worker():
+        while True:
+            batch = work.get()
+            if batch is None:
+                return
+            try:
+                records = handle_batch(batch)
+            except Exception as e:
+                errors.append(e)
+                records = 0
+            with lock:
+                totals["records"] += records
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    try:
+        consumed = 0
+        with tqdm(total=total_size, unit='B', unit_scale=True, desc=desc) as pbar:
+            for batch, position in batches:
+                if errors:
+                    break
+                work.put(batch)
+                pbar.update(position - consumed)
+                consumed = position
+    finally:
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return totals["records"]
+
+# Grows the batch while transactions commit well under the target latency and
+# halves it when they run over, so batches track what the server sustains.
+class AdaptiveBatchSize:
+    def __init__(self, initial=10000, minimum=500, maximum=100000, target_seconds=1.0):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+
+    def observe(self, seconds):
+        if seconds > self.target_seconds * 1.5:
+            self.size = max(self.minimum, self.size // 2)
+        elif seconds < self.target_seconds / 2:
+            self.size = min(self.maximum, int(self.size * 1.5))
+
+# Phase 1 input: every category name once, in batches, as it is first seen
+def stream_node_batches(file_path, batch_size=10000):
+    seen = set()
+    names = []
+    position = 0
+    for rows, position in stream_csv_batches(file_path, batch_size):
+        for row in rows:
+            for name in (row["category"], row["subcategory"]):
+                if name not in seen:
+                    seen.add(name)
+                    names.append(name)
+        if len(names) >= batch_size:
+            yield names, position
+            names = []
+    if names:
+        yield names, position
+
+# Phase 2: rows are routed to a worker by their source category, so no two
+# concurrent transactions ever write relationships from the same node.
+# Each worker sizes its own transactions with an AdaptiveBatchSize.
+def run_partitioned_pipeline(file_path, handle_batch, num_threads=4, chunk_size=1000, queue_depth=4, initial_batch_size=10000):
+    queues = [queue.Queue(maxsize=queue_depth) for _ in range(num_threads)]
+    lock = threading.Lock()
+    totals = {"records": 0}
+    errors = []
+
+    def commit(rows, sizer):
+        started = time.time()
+        records = handle_batch(rows)
+        sizer.observe(time.time() - started)
+        with lock:
+            totals["records"] += records
+
+    def worker(work):
+        sizer = AdaptiveBatchSize(initial=initial_batch_size)
+        pending = []
+        while True:
+            chunk = work.get()
+            if chunk is None:
+                break
+            if errors:
+                continue
+            pending.extend(chunk)
+            try:
+                while len(pending) >= sizer.size:
+                    batch, pending = pending[:sizer.size], pending[sizer.size:]
+                    commit(batch, sizer)
+            except Exception as e:
+                errors.append(e)
+        if pending and not errors:
+            try:
+                commit(pending, sizer)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(work,), daemon=True) for work in queues]
+    for thread in threads:
+        thread.start()
+    try:
+        consumed = 0
+        buffers = [[] for _ in range(num_threads)]
+        with tqdm(total=os.path.getsize(file_path), unit='B', unit_scale=True, desc="Creating relationships") as pbar:
+            for rows, position in stream_csv_batches(file_path, chunk_size):
+                if errors:
+                    break
+                for row in rows:
+                    partition = hash(row["category"]) % num_threads
+                    buffers[partition].append(row)
+                    if len(buffers[partition]) >= chunk_size:
+                        queues[partition].put(buffers[partition])
+                        buffers[partition] = []
+                pbar.update(position - consumed)
+                consumed = position
+        for partition, rows in enumerate(buffers):
+            if rows:
+                queues[partition].put(rows)
+    finally:
+        for work in queues:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return totals["records"]
+
+def relationship_rows(pairs):
+    return [{"category": category, "subcategory": subcategory} for category, subcategory in pairs]
 
 def import_batch(batch, max_retries=3):
+    started = time.perf_counter()
     retries = 0
     while retries < max_retries:
         try:
             with suppress_specific_warnings():
                 process_batch(batch)
+            record_batch("import_batch", time.perf_counter() - started, len(batch), retries)
             return len(batch)
         except TransientError:
             retries += 1
             time.sleep((2 ** retries) * 0.5)
     print(f"Failed to process batch after {max_retries} retries: {batch}")
+    record_batch("import_batch", time.perf_counter() - started, 0, retries)
     return 0
 
-def import_data(file_path, batch_size=10000, max_retries=3, num_threads=4):
+# With `parse_processes`, the dump is decompressed once and parsed by that many
+# processes in parallel byte ranges (parallel_csv.py) instead of by one thread.
+def import_data(file_path, batch_size=10000, max_retries=3, num_threads=4, parse_processes=None):
     start_time = time.time()
 
-    decompressed_file_path = decompress_file(file_path)
     driver = get_driver()
 
     try:
@@ -77,23 +247,98 @@ def import_data(file_path, batch_size=10000, max_retries=3, num_threads=4):
             session.execute_write(create_unique_constraint)
             session.execute_write(create_index)
 
-        batches = read_csv_in_batches(decompressed_file_path, batch_size)
+        if parse_processes:
+            # Batches stay (category, subcategory) tuples on the reader thread;
+            # each worker builds the query rows for its own batch
+            with decompressed_file(file_path) as csv_path:
+                total_records = run_batch_pipeline(
+                    stream_parsed_batches(csv_path, batch_size, parse_processes),
+                    lambda pairs: import_batch(relationship_rows(pairs), max_retries),
+                    os.path.getsize(csv_path), num_threads
+                )
+        else:
+            total_records = run_batch_pipeline(
+                stream_csv_batches(file_path, batch_size), lambda batch: import_batch(batch, max_retries),
+                os.path.getsize(file_path), num_threads
+            )
 
-        total_records = 0
-        with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            futures = {executor.submit(import_batch, batch, max_retries): batch for batch in batches}
-            for future in tqdm(as_completed(futures), total=len(futures), desc="Importing Data to Neo4j"):
-                total_records += future.result()
+        elapsed = time.time() - start_time
+        print(f"Execution completed.\n"
+              f"Total Records Created: {total_records}")
+
+        print(f"Importing Data executed in {elapsed:.4f} seconds "
+              f"({total_records / elapsed:.0f} rows/s).")
+
+    finally:
+        close_driver()
+        invalidate_cache()
+
+# Two-phase import into an empty database: phase 1 CREATEs every distinct
+# category once, phase 2 MATCHes both endpoints and only writes relationships.
+# No MERGE on nodes means no lock contention between batches on hub categories.
+def import_data_two_phase(file_path, batch_size=10000, num_threads=4):
+    start_time = time.time()
+
+    driver = get_driver()
 
+    try:
+        with driver.session() as session:
+            session.execute_write(create_unique_constraint)
+            session.execute_write(create_index)
+
+        total_nodes = run_batch_pipeline(
+            stream_node_batches(file_path, batch_size), recorded_batches("create_nodes", process_node_batch),
+            os.path.getsize(file_path), num_threads, desc="Creating nodes"
+        )
+        node_time = time.time() - start_time
+        print(f"Phase 1: {total_nodes} nodes created in {node_time:.4f} seconds "
+              f"({total_nodes / node_time:.0f} nodes/s).")
+
+        phase_start = time.time()
+        total_records = run_partitioned_pipeline(
+            file_path, recorded_batches("create_relationships", process_relationship_batch), num_threads, initial_batch_size=batch_size
+        )
+        relationship_time = time.time() - phase_start
+        print(f"Phase 2: {total_records} rows imported in {relationship_time:.4f} seconds "
+              f"({total_records / relationship_time:.0f} rows/s).")
+
+        elapsed = time.time() - start_time
         print(f"Execution completed.\n"
               f"Total Records Created: {total_records}")
 
-        print(f"Importing Data executed in {time.time() - start_time:.4f} seconds.")
+        print(f"Importing Data executed in {elapsed:.4f} seconds "
+              f"({total_records / elapsed:.0f} rows/s).")
 
     finally:
         close_driver()
-        if decompressed_file_path != file_path:
-            os.remove(decompressed_file_path)
+        invalidate_cache()
 
 if __name__ == "__main__":
-    import_data("taxonomy_iw.csv.gz")
+    args = sys.argv[1:]
+    two_phase = "--two-phase" in args
+    if two_phase:
+        args.remove("--two-phase")
+    parse_processes = None
+    if "--parallel-parse" in args:
+        position = args.index("--parallel-parse")
+        parse_processes = int(args[position + 1])
+        del args[position:position + 2]
+        if two_phase:
+            print("--parallel-parse cannot be combined with --two-phase.")
+            sys.exit(1)
+    options = {}
+    for option in ("--metrics", "--metrics-file"):
+        if option in args:
+            position = args.index(option)
+            options[option] = args[position + 1]
+            del args[position:position + 2]
+    file_path = args[0] if args else data_file
+    if options:
+        configure(options.get("--metrics", "json"), options.get("--metrics-file"))
+    try:
+        if two_phase:
+            import_data_two_phase(file_path)
+        else:
+            import_data(file_path, parse_processes=parse_processes)
+    finally:
+        close_metrics()
@@ -0,0 +1,294 @@
+import contextlib
+import json
+import sys
+import threading
+import time
+
+# Per-query instrumentation for goal queries and import batches.
+#
+# When enabled (configure()), open_backend() hands the goal functions an
+# InstrumentedTx instead of the raw transaction. Every tx.run() is then timed
+# from submission to the first record and to the last one, and the rows
+# streamed are counted. With profile=True queries run under PROFILE and the
+# plan's db hits and operators are added. Import batches are recorded through
+# record_batch() with their row count and retries. Goal 12's async driver
+# sessions are wrapped the same way by instrumented_async().
+#
+# Each finished query or batch is written as one JSON line to the metrics
+# stream (format "json"), and totals per goal and query can be dumped in the
+# Prometheus text format (format "prometheus") when the process exits.
+
+METRIC_FIELDS = [
+    ("calls", "Queries or batches run"),
+    ("seconds", "Wall-clock seconds from submission to the last record"),
+    ("first_record_seconds", "Seconds from submission to the first record"),
+    ("records", "Records streamed back or rows written"),
+    ("retries", "Retries after transient errors"),
+    ("db_hits", "Database hits reported by PROFILE"),
+]
+
+
+class Metrics:
+    def __init__(self, output_format="json", stream=None, profile=False):
+        self.output_format = output_format
+        self.stream = stream or sys.stderr
+        self.profile = profile
+        self.goal = None
+        self.lock = threading.Lock()
+        self.totals = {}
+
+    def record(self, query, elapsed, first_record=None, records=0, retries=0, summary=None):
+        event = {
+            "goal": self.goal, "query": query, "seconds": round(elapsed, 6),
+            "first_record_seconds": None if first_record is None else round(first_record, 6),
+            "records": records, "retries": retries,
+        }
+        if summary is not None:
+            event.update(summary_fields(summary))
+        with self.lock:
+            totals = self.totals.setdefault((self.goal, query), dict.fromkeys(name for name, _ in METRIC_FIELDS))
+            for name, _ in METRIC_FIELDS:
+                value = 1 if name == "calls" else event.get(name)
+                if value is not None:
+                    totals[name] = (totals[name] or 0) + value
+            if self.output_format == "json":
+                self.stream.write(json.dumps(event) + "\n")
+                self.stream.flush()
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            for name, help_text in METRIC_FIELDS:
+                metric = f"dbcli_query_{name}_total"
+                lines.append(f"# HELP {metric} {help_text}.")
+                lines.append(f"# TYPE {metric} counter")
+                for (goal, query), totals in sorted(self.totals.items(), key=lambda item: str(item[0])):
+                    if totals[name] is not None:
+                        lines.append(f'{metric}{{goal="{goal or ""}",query="{query}"}} {totals[name]}')
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        if self.output_format == "prometheus":
+            self.stream.write(self.prometheus_text())
+        if self.stream not in (sys.stdout, sys.stderr):
+            self.stream.close()
+
+
+# Server-side figures from a neo4j ResultSummary
+def summary_fields(summary):
+    fields = {
+        "server_first_record_ms": summary.result_available_after,
+        "server_consumed_ms": summary.result_consumed_after,
+    }
+    counters = {name: value for name, value in vars(summary.counters).items()
+                if not name.startswith("_") and value}
+    if counters:
+        fields["counters"] = counters
+    if summary.profile:
+        operators = []
+        fields["db_hits"] = plan_db_hits(summary.profile, operators)
+        fields["operators"] = operators
+    return fields
+
+
+def plan_db_hits(plan, operators):
+    operators.append(plan.get("operatorType"))
+    return plan.get("dbHits", 0) + sum(plan_db_hits(child, operators) for child in plan.get("children", []))
+
+
+class InstrumentedResult:
+    def __init__(self, metrics, query, result, started):
+        self.metrics = metrics
+        self.query = query
+        self.result = result
+        self.started = started
+        self.first_record = None
+        self.records = 0
+        self.finished = False
+
+    def __iter__(self):
+        for record in self.result:
+            if self.first_record is None:
+                self.first_record = time.perf_counter() - self.started
+            self.records += 1
+            yield record
+        self.finish()
+
+    # single(), value(), data() and friends drain the result in one call
+    def __getattr__(self, name):
+        attribute = getattr(self.result, name)
+        if not callable(attribute) or name == "keys":
+            return attribute
+
+        def call(*args, **kwargs):
+            value = attribute(*args, **kwargs)
+            if self.first_record is None:
+                self.first_record = time.perf_counter() - self.started
+            if name == "peek":
+                return value
+            if name == "single":
+                self.records += value is not None
+            elif isinstance(value, list):
+                self.records += len(value)
+            self.finish()
+            return value
+        return call
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        try:
+            summary = self.result.consume()
+        except Exception:
+            # The transaction failed or was closed; the timings still count
+            summary = None
+        self.metrics.record(self.query, time.perf_counter() - self.started, self.first_record,
+                            self.records, summary=summary)
+
+
+# Wraps a transaction (or a session) so each run() is recorded under the name
+# of the goal function that issued it
+class InstrumentedTx:
+    def __init__(self, tx, metrics):
+        self.tx = tx
+        self.metrics = metrics
+        self.pending = []
+
+    def run(self, query, parameters=None, **kwargs):
+        name = sys._getframe(1).f_code.co_name
+        if self.metrics.profile:
+            query = "PROFILE " + query
+        started = time.perf_counter()
+        result = InstrumentedResult(self.metrics, name, self.tx.run(query, parameters, **kwargs), started)
+        self.pending.append(result)
+        return result
+
+    # Records results that were only peeked at or not read to the end
+    def flush(self):
+        for result in self.pending:
+            result.finish()
+        self.pending = []
+
+    def __getattr__(self, name):
+        return getattr(self.tx, name)
+
+
+# Async counterpart of InstrumentedResult for the async driver (goal 12)
+class InstrumentedAsyncResult:
+    def __init__(self, metrics, query, result, started):
+        self.metrics = metrics
+        self.query = query
+        self.result = result
+        self.started = started
+        self.first_record = None
+        self.records = 0
+        self.finished = False
+
+    async def __aiter__(self):
+        async for record in self.result:
+            if self.first_record is None:
+                self.first_record = time.perf_counter() - self.started
+            self.records += 1
+            yield record
+        try:
+            summary = await self.result.consume()
+        except Exception:
+            summary = None
+        self.finish(summary)
+
+    def finish(self, summary=None):
+        if self.finished:
+            return
+        self.finished = True
+        self.metrics.record(self.query, time.perf_counter() - self.started, self.first_record,
+                            self.records, summary=summary)
+
+
+class InstrumentedAsyncSession:
+    def __init__(self, session, metrics):
+        self.session = session
+        self.metrics = metrics
+        self.pending = []
+
+    async def run(self, query, parameters=None, **kwargs):
+        name = sys._getframe(1).f_code.co_name
+        if self.metrics.profile:
+            query = "PROFILE " + query
+        started = time.perf_counter()
+        result = InstrumentedAsyncResult(self.metrics, name, await self.session.run(query, parameters, **kwargs), started)
+        self.pending.append(result)
+        return result
+
+    # Results cut short (a cancelled branch) are recorded with the timings
+    # so far, without a server summary
+    def flush(self):
+        for result in self.pending:
+            result.finish()
+        self.pending = []
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+metrics = None
+
+
+def configure(output_format="json", path=None, profile=False):
+    global metrics
+    stream = open(path, 'a', encoding='utf-8') if path else None
+    metrics = Metrics(output_format, stream, profile)
+    return metrics
+
+
+def set_goal(goal):
+    if metrics is not None:
+        metrics.goal = goal
+
+
+# Yields `tx` wrapped for recording, or unchanged when instrumentation is off
+@contextlib.contextmanager
+def instrumented(tx):
+    if metrics is None:
+        yield tx
+        return
+    wrapped = InstrumentedTx(tx, metrics)
+    try:
+        yield wrapped
+    finally:
+        wrapped.flush()
+
+
+# instrumented() for a session of the async driver
+@contextlib.asynccontextmanager
+async def instrumented_async(session):
+    if metrics is None:
+        yield session
+        return
+    wrapped = InstrumentedAsyncSession(session, metrics)
+    try:
+        yield wrapped
+    finally:
+        wrapped.flush()
+
+
+def record_batch(query, elapsed, records, retries=0):
+    if metrics is not None:
+        metrics.record(query, elapsed, records=records, retries=retries)
+
+
+# Wraps an import batch handler returning its row count
+def recorded_batches(query, handle_batch):
+    def handle(batch):
+        started = time.perf_counter()
+        records = handle_batch(batch)
+        record_batch(query, time.perf_counter() - started, records)
+        return records
+    return handle
+
+
+def close_metrics():
+    global metrics
+    if metrics is not None:
+        metrics.close()
+        metrics = None
@@ -0,0 +1,197 @@
+from itertools import chain
+from path_search import find_paths, count_paths_by_length, expand_levels
+from path_output import build_path_dag
+from parallel_paths import find_paths_parallel
+from shortest_paths import k_shortest_paths
+
+# Same goal API as goals.py, answered from an in-process CSRGraph instead of a
+# Neo4j transaction. The graph takes the place of `tx` in every signature.
+
+
+def node_exists(graph, node_name):
+    return graph.node_id(node_name) is not None
+
+def suggest_names(graph, node_name, limit=5):
+    return graph.suggest(node_name, limit)
+
+# Goal 8
+def find_root_node(graph):
+    for node_id in graph.degrees.root_ids():
+        yield graph.name(node_id)
+
+# Goal 9
+def find_nodes_with_most_children(graph, top=None):
+    for _, node_id in graph.degrees.most_children(top):
+        yield graph.name(node_id)
+
+# Goal 10
+def find_nodes_with_least_children(graph):
+    _, node_ids = graph.degrees.least_children()
+    for node_id in node_ids:
+        yield graph.name(node_id)
+
+# Goal 11
+def rename_node(graph, old_name, new_name):
+    try:
+        graph.rename(old_name, new_name)
+    except ValueError as e:
+        print(e)
+        return False
+    return True
+
+# Goal 11 in bulk
+def find_existing_names(graph, node_names):
+    return {name for name, node_id in zip(node_names, graph.node_ids(node_names)) if node_id is not None}
+
+# Like goals.rename_nodes, and all or nothing like its transaction: a taken
+# new name raises before any row is applied
+def rename_nodes(graph, rows):
+    with graph.lock:
+        found = [row for row in rows if graph.node_id(row["old"]) is not None]
+        for row in found:
+            if graph.node_id(row["new"]) is not None:
+                raise ValueError(f"Node with name '{row['new']}' already exists.")
+        for row in found:
+            graph.rename(row["old"], row["new"])
+        return [row["old"] for row in found]
+
+# Goal 12
+def find_all_paths(graph, start_node, end_node, search_depth, deadline=None):
+    start, end = graph.node_id(start_node), graph.node_id(end_node)
+    if start is None or end is None:
+        return
+    for path in find_paths(lambda frontier: parent_edges(graph, frontier), start, end, search_depth, deadline):
+        yield " --> ".join(graph.name(node_id) for node_id in path)
+
+# Goal 12 over `processes` worker processes, in no fixed order
+def find_all_paths_parallel(graph, start_node, end_node, search_depth, processes=None, deadline=None):
+    start, end = graph.node_id(start_node), graph.node_id(end_node)
+    if start is None or end is None:
+        return
+    fetch_parents = lambda frontier: parent_edges(graph, frontier)
+    for path in find_paths_parallel(fetch_parents, start, end, search_depth, processes, deadline=deadline):
+        yield " --> ".join(graph.name(node_id) for node_id in path)
+
+# Goal 12, count only: ({path length: number of paths}, exact)
+def count_all_paths(graph, start_node, end_node, search_depth):
+    start, end = graph.node_id(start_node), graph.node_id(end_node)
+    if start is None or end is None:
+        return {}, True
+    return count_paths_by_length(lambda frontier: parent_edges(graph, frontier), start, end, search_depth)
+
+# Goal 12 as a compact path DAG (see path_output.py)
+def find_path_dag(graph, start_node, end_node, search_depth):
+    start, end = graph.node_id(start_node), graph.node_id(end_node)
+    if start is None or end is None:
+        return None
+    fetch_parents = lambda frontier: parent_edges(graph, frontier)
+    return build_path_dag(fetch_parents, start, end, search_depth, graph.name)
+
+def parent_edges(graph, frontier):
+    for child in frontier:
+        for parent in graph.parents(child):
+            yield parent, child
+
+# Goal 1
+def find_all_children(graph, node_name):
+    for child in graph.children(graph.node_id(node_name)):
+        yield graph.name(child)
+
+# Goal 2
+def count_all_children(graph, node_name):
+    return graph.out_degree(graph.node_id(node_name))
+
+# Goal 3
+def find_all_grandchildren(graph, node_name):
+    for child in graph.children(graph.node_id(node_name)):
+        for grandchild in graph.children(child):
+            yield graph.name(grandchild)
+
+# Goal 4
+def find_all_parents(graph, node_name):
+    for parent in graph.parents(graph.node_id(node_name)):
+        yield graph.name(parent)
+
+# Goal 5
+def count_all_parents(graph, node_name):
+    return graph.in_degree(graph.node_id(node_name))
+
+# Goal 6
+def find_all_grandparents(graph, node_name):
+    for parent in graph.parents(graph.node_id(node_name)):
+        for grandparent in graph.parents(parent):
+            yield graph.name(grandparent)
+
+# Goals 1-6 for many nodes: (name, found, value) rows like goals.batch_node_goal
+def batch_node_goal(graph, goal, node_names):
+    list_goals = {1: find_all_children, 3: find_all_grandchildren, 4: find_all_parents, 6: find_all_grandparents}
+    count_goals = {2: count_all_children, 5: count_all_parents}
+    node_names = list(dict.fromkeys(node_names))
+    for node_name, node_id in zip(node_names, graph.node_ids(node_names)):
+        if node_id is None:
+            yield node_name, False, None
+        elif goal in count_goals:
+            yield node_name, True, count_goals[goal](graph, node_name)
+        else:
+            found_any = False
+            for value in list_goals[goal](graph, node_name):
+                found_any = True
+                yield node_name, True, value
+            if not found_any:
+                yield node_name, True, None
+
+# Goals 14-18 are answered by the reachability index (reachability.py),
+# built on first use
+# Goal 14
+def is_descendant(graph, ancestor, descendant):
+    return graph.reachability.is_descendant(graph.node_id(ancestor), graph.node_id(descendant))
+
+# Goal 15
+def count_all_descendants(graph, node_name):
+    return graph.reachability.descendant_count(graph.node_id(node_name))
+
+# Goal 16
+def count_all_ancestors(graph, node_name):
+    return graph.reachability.ancestor_count(graph.node_id(node_name))
+
+# Goal 17
+def find_all_descendants(graph, node_name):
+    for node_id in graph.reachability.descendants(graph.node_id(node_name)):
+        yield graph.name(node_id)
+
+# Goal 18
+def find_all_ancestors(graph, node_name):
+    for node_id in graph.reachability.ancestors(graph.node_id(node_name)):
+        yield graph.name(node_id)
+
+# Goal 20: (depth, name) for every descendant within `max_depth` hops
+def find_descendants_within(graph, node_name, max_depth, level_limit=None):
+    fetch_children = lambda frontier, visited, limit: (child for node_id in frontier for child in graph.children(node_id))
+    for depth, node_id in expand_levels(fetch_children, graph.node_id(node_name), max_depth, level_limit):
+        yield depth, graph.name(node_id)
+
+# Goal 21
+def find_ancestors_within(graph, node_name, max_depth, level_limit=None):
+    fetch_parents = lambda frontier, visited, limit: (parent for node_id in frontier for parent in graph.parents(node_id))
+    for depth, node_id in expand_levels(fetch_parents, graph.node_id(node_name), max_depth, level_limit):
+        yield depth, graph.name(node_id)
+
+# Goal 7
+def count_unique_nodes(graph):
+    return graph.node_count
+
+
+# Goal 19 and the goal 12 fallback: the k shortest loopless paths, following
+# relationships downwards, or in either direction with directed=False
+def find_shortest_paths(graph, start_node, end_node, k=1, directed=True):
+    start, end = graph.node_id(start_node), graph.node_id(end_node)
+    if start is None or end is None:
+        return
+    children = lambda frontier: ((node_id, child) for node_id in frontier for child in graph.children(node_id))
+    parents = lambda frontier: ((node_id, parent) for node_id in frontier for parent in graph.parents(node_id))
+    if directed:
+        forward, backward = children, parents
+    else:
+        forward = backward = lambda frontier: chain(children(frontier), parents(frontier))
+    for path in k_shortest_paths(forward, backward, start, end, k):
+        yield " --> ".join(graph.name(node_id) for node_id in path)
@@ -0,0 +1,74 @@
+import difflib
+from bisect import bisect_left, bisect_right
+
+# Sorted, deduplicated category names with integer ids.
+#
+# `names` maps id -> name. When ids were assigned in name order (as CSRGraph
+# does) `order` is None and lookups bisect the name list directly; otherwise
+# `order` lists the ids sorted by name, as stored in a snapshot. Each distinct
+# name is held once, so a table built from millions of CSV rows costs one
+# string per category.
+
+
+class NameIndex:
+    def __init__(self, names, order=None):
+        self.names = names
+        self.order = order
+
+    def __len__(self):
+        return len(self.names)
+
+    def name(self, node_id):
+        return self.names[node_id]
+
+    def _sorted_ids(self):
+        return range(len(self.names)) if self.order is None else self.order
+
+    def lookup(self, name):
+        if self.order is None:
+            position = bisect_left(self.names, name)
+            if position < len(self.names) and self.names[position] == name:
+                return position
+            return None
+        position = bisect_left(self.order, name, key=self.names.__getitem__)
+        if position < len(self.order) and self.names[self.order[position]] == name:
+            return self.order[position]
+        return None
+
+    # Resolves a whole batch of names; None marks names that are not present
+    def lookup_many(self, names):
+        if self.order is not None:
+            return [self.lookup(name) for name in names]
+        table, size = self.names, len(self.names)
+        ids = []
+        for name in names:
+            position = bisect_left(table, name)
+            ids.append(position if position < size and table[position] == name else None)
+        return ids
+
+    # [low, high) range of sorted positions whose names start with prefix
+    def prefix_range(self, prefix):
+        names = self.names
+        if self.order is None:
+            low = bisect_left(names, prefix)
+            high = bisect_right(names, prefix, low, key=lambda name: name[:len(prefix)])
+            return low, high
+        low = bisect_left(self.order, prefix, key=names.__getitem__)
+        high = bisect_right(self.order, prefix, low, key=lambda i: names[i][:len(prefix)])
+        return low, high
+
+    def with_prefix(self, prefix, limit=None):
+        low, high = self.prefix_range(prefix)
+        if limit is not None:
+            high = min(high, low + limit)
+        sorted_ids = self._sorted_ids()
+        return [self.names[sorted_ids[position]] for position in range(low, high)]
+
+    # "Did you mean" candidates: names sharing the longest prefix with `name`,
+    # ranked by similarity
+    def suggest(self, name, limit=5, max_candidates=500):
+        for length in range(len(name), 0, -1):
+            candidates = self.with_prefix(name[:length], max_candidates)
+            if candidates:
+                return difflib.get_close_matches(name, candidates, n=limit, cutoff=0)
+        return []
@@ -0,0 +1,142 @@
+from collections import deque
+import csv
+import io
+from itertools import islice
+import multiprocessing
+import os
+
+# Multi-process parser for the decompressed taxonomy CSV.
+#
+# The file is cut into byte ranges that start right after a newline that is
+# not itself escaped (an odd run of '\\' before it). Each range is read and
+# parsed by a pool process with the importer's csv dialect. A newline can
+# still sit inside a quoted field, so the cut points are speculative: a range
+# that starts on a true record boundary and ends inside a quoted field fails
+# with csv's "unexpected end of data" in strict mode. The failed range is then
+# parsed again together with the next one, whose own start was false.
+# Ranges are consumed in file order, so a range is only ever trusted once its
+# predecessor has parsed cleanly up to the cut point.
+#
+# A process hands back one ParsedRange per byte range. Its fields are joined
+# by NUL into a single string, which is pickled as one block instead of one
+# object per row. Rows that contain NUL themselves are sent as plain tuples,
+# along with their position in the range.
+
+DIALECT = {"quotechar": '"', "escapechar": '\\', "doublequote": False}
+SEPARATOR = "\x00"
+
+
+class ParsedRange:
+    def __init__(self, joined, row_count, other_rows, end):
+        self.joined = joined
+        self.row_count = row_count
+        self.other_rows = other_rows
+        self.end = end
+
+    # (category, subcategory) pairs in file order
+    def rows(self):
+        fields = self.joined.split(SEPARATOR) if self.row_count else []
+        pairs = zip(fields[0::2], fields[1::2])
+        position = 0
+        for index, row in self.other_rows:
+            for _ in range(index - position):
+                yield next(pairs)
+            yield row
+            position = index + 1
+        yield from pairs
+
+
+# Start offsets of `parts` ranges, each just after an unescaped newline
+def split_ranges(file_path, parts, probe_size=65536):
+    size = os.path.getsize(file_path)
+    starts = [0]
+    with open(file_path, 'rb') as file:
+        for part in range(1, parts):
+            position = max(size * part // parts, starts[-1] + 1)
+            while position < size:
+                file.seek(position)
+                block = file.read(probe_size)
+                newline = block.find(b"\n")
+                if newline < 0:
+                    position += len(block)
+                    continue
+                backslashes = len(block[:newline]) - len(block[:newline].rstrip(b"\\"))
+                position += newline + 1
+                if backslashes % 2 == 0:
+                    break
+            if position >= size:
+                break
+            starts.append(position)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+# Parses [start, end); None when `end` turned out to fall inside a quoted field
+def parse_range(task):
+    file_path, start, end, strict = task
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    reader = csv.reader(io.StringIO(data.decode('utf-8'), newline=''), strict=strict, **DIALECT)
+    fields = []
+    other_rows = []
+    try:
+        for row in reader:
+            if len(row) == 2:
+                if SEPARATOR in row[0] or SEPARATOR in row[1]:
+                    other_rows.append((len(fields) // 2 + len(other_rows), tuple(row)))
+                else:
+                    fields.extend(row)
+    except csv.Error as e:
+        if "unexpected end of data" in str(e):
+            return None
+        raise
+    return ParsedRange(SEPARATOR.join(fields), len(fields) // 2, other_rows, end)
+
+
+# ParsedRange results in file order. The last range is parsed leniently, like
+# csv.reader over the whole file, so a truncated final record is not an error.
+# At most `window` ranges (twice the processes by default) are submitted or
+# parsed but not yet consumed, so a slow consumer holds the parser back
+# instead of the parsed dump piling up in this process.
+def parse_file(file_path, processes=None, ranges_per_process=4, window=None):
+    processes = processes or os.cpu_count() or 1
+    window = window or processes * 2
+    ranges = split_ranges(file_path, processes * ranges_per_process)
+    tasks = iter([(file_path, start, end, index < len(ranges) - 1) for index, (start, end) in enumerate(ranges)])
+    with multiprocessing.Pool(processes) as pool:
+        pending = deque((task, pool.apply_async(parse_range, (task,))) for task in islice(tasks, window))
+        carry_start = None
+        while pending:
+            (_, start, end, strict), result = pending.popleft()
+            parsed = result.get()
+            task = next(tasks, None)
+            if task is not None:
+                pending.append((task, pool.apply_async(parse_range, (task,))))
+            if carry_start is not None:
+                # This range's start was inside a quoted field: re-parse from
+                # the last true boundary instead
+                start, carry_start = carry_start, None
+                parsed = parse_range((file_path, start, end, strict))
+            if parsed is None:
+                carry_start = start
+                continue
+            yield parsed
+
+
+# (batch, bytes consumed) pairs like import_data.stream_csv_batches, but each
+# batch holds (category, subcategory) tuples; the caller builds query rows
+# where it needs them
+def stream_parsed_batches(file_path, batch_size=10000, processes=None):
+    batch = []
+    position = 0
+    for parsed in parse_file(file_path, processes):
+        rows = parsed.rows()
+        while True:
+            batch.extend(islice(rows, batch_size - len(batch)))
+            if len(batch) < batch_size:
+                break
+            yield batch, position
+            batch = []
+        position = parsed.end
+    if batch:
+        yield batch, position
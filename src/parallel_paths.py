@@ -0,0 +1,252 @@
+import multiprocessing
+import os
+import queue
+from array import array
+from multiprocessing import shared_memory
+from path_search import distances_to_target, expired
+
+# Multi-process goal 12 enumeration.
+#
+# The parent runs the reverse BFS of path_search.py (in memory, or one Neo4j
+# query per level) and packs its result, the distance of every node to the
+# end node and the forward edges into that set, as int32 CSR arrays over local
+# node ids in one shared memory block. Workers attach to the block by name, so
+# the graph is never pickled, whatever the start method.
+#
+# The search space is split by the first `split_depth` hops from the start
+# node: every valid prefix of that length is a task on a shared queue, and
+# idle workers take the next one. Subtrees are very uneven in a taxonomy, so
+# a worker that has expanded `split_after` nodes of one task while the queue
+# is empty donates the untried siblings nearest the root of its DFS. They go
+# back through the parent, which is the only process that enqueues tasks, so
+# it always knows how many are outstanding. Found paths stream back in
+# batches and the parent merges them as they arrive; the order of paths
+# therefore differs between runs.
+
+TASK_DONE = "done"
+TASK_SPLIT = "split"
+TASK_PATHS = "paths"
+TASK_ERROR = "error"
+
+
+# Distances and pruned successors of the reverse BFS as int32 arrays over
+# local ids: (nodes by local id, distance, offsets, targets)
+def pack_search_space(distance, successors):
+    nodes = list(distance)
+    local = {node: i for i, node in enumerate(nodes)}
+    offsets = array('i', [0])
+    targets = array('i')
+    for node in nodes:
+        targets.extend(local[child] for child in successors.get(node, ()))
+        offsets.append(len(targets))
+    return nodes, array('i', (distance[node] for node in nodes)), offsets, targets
+
+
+def share_arrays(*arrays):
+    size = sum(len(data) * data.itemsize for data in arrays)
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    position = 0
+    for data in arrays:
+        raw = data.tobytes()
+        block.buf[position:position + len(raw)] = raw
+        position += len(raw)
+    return block
+
+
+def attach_arrays(block, *lengths):
+    view = block.buf.cast('i')
+    arrays = []
+    position = 0
+    for length in lengths:
+        arrays.append(view[position:position + length])
+        position += length
+    return arrays
+
+
+# DFS below one prefix, with the serial enumerator's semantics: a
+# relationship is used at most once per path. After every `split_after`
+# expansions, the untried siblings nearest the root are handed to
+# `donate(prefixes)` if `queue_empty()`.
+def enumerate_prefix(prefix, distance, offsets, targets, end, max_depth, split_after, queue_empty, donate):
+    path = list(prefix)
+    used_edges = set(zip(prefix, prefix[1:]))
+    base = len(prefix) - 1
+    node = prefix[-1]
+    stack = [iter(targets[offsets[node]:offsets[node + 1]])]
+    expanded = 0
+    while stack:
+        child = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+            if len(path) > len(prefix):
+                used_edges.discard((path[-2], path[-1]))
+            path.pop()
+            continue
+        edge = (path[-1], child)
+        if distance[child] > max_depth - len(path) or edge in used_edges:
+            continue
+        used_edges.add(edge)
+        path.append(child)
+        if child == end:
+            yield list(path)
+        stack.append(iter(targets[offsets[child]:offsets[child + 1]]))
+        expanded += 1
+        if expanded >= split_after and queue_empty():
+            expanded = 0
+            donated = split_stack(path, stack, base, distance, max_depth)
+            if donated:
+                # The donated tasks start below their prefix, so a prefix
+                # that is itself a path is reported here
+                for donated_prefix in donated:
+                    if donated_prefix[-1] == end:
+                        yield donated_prefix
+                donate(donated)
+
+
+# Takes the untried children at the shallowest level that has any off the
+# stack and returns them as prefixes of their own
+def split_stack(path, stack, base, distance, max_depth):
+    for level in range(len(stack) - 1):
+        remaining = list(stack[level])
+        if not remaining:
+            continue
+        stack[level] = iter(())
+        root = path[:base + level + 1]
+        root_edges = set(zip(root, root[1:]))
+        return [
+            root + [child] for child in remaining
+            if distance[child] <= max_depth - len(root) and (root[-1], child) not in root_edges
+        ]
+    return []
+
+
+def path_worker(block_name, lengths, end, max_depth, split_after, batch_size, tasks, results, queued):
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        distance, offsets, targets = attach_arrays(block, *lengths)
+        while True:
+            prefix = tasks.get()
+            if prefix is None:
+                break
+            with queued.get_lock():
+                queued.value -= 1
+            queue_empty = lambda: queued.value == 0
+            donate = lambda prefixes: results.put((TASK_SPLIT, prefixes))
+            batch = []
+            try:
+                for path in enumerate_prefix(
+                    prefix, distance, offsets, targets, end, max_depth, split_after, queue_empty, donate
+                ):
+                    batch.append(path)
+                    if len(batch) == batch_size:
+                        results.put((TASK_PATHS, batch))
+                        batch = []
+            except Exception as e:
+                results.put((TASK_ERROR, str(e)))
+            if batch:
+                results.put((TASK_PATHS, batch))
+            results.put((TASK_DONE, None))
+        del distance, offsets, targets
+    finally:
+        block.close()
+
+
+# Prefixes of up to `split_depth` hops, plus the paths that end within them
+def initial_prefixes(distance, offsets, targets, start, end, max_depth, split_depth):
+    prefixes = [[start]]
+    found = []
+    for _ in range(split_depth):
+        longer = []
+        for prefix in prefixes:
+            edges = set(zip(prefix, prefix[1:]))
+            node = prefix[-1]
+            for child in targets[offsets[node]:offsets[node + 1]]:
+                if distance[child] > max_depth - len(prefix) or (node, child) in edges:
+                    continue
+                if child == end:
+                    found.append(prefix + [child])
+                longer.append(prefix + [child])
+        prefixes = longer
+    return found, prefixes
+
+
+# Same paths as path_search.find_paths, as lists of node keys, in no fixed order
+# (with path_search.find_paths' `deadline`)
+def find_paths_parallel(fetch_parents, start, end, max_depth, processes=None, split_depth=2,
+                        split_after=65536, batch_size=1000, deadline=None):
+    distance_map, successors = distances_to_target(fetch_parents, end, max_depth, deadline)
+    if distance_map.get(start, max_depth + 1) > max_depth or expired(deadline):
+        return
+    nodes, distance, offsets, targets = pack_search_space(distance_map, successors)
+    local = {node: i for i, node in enumerate(nodes)}
+    start_id, end_id = local[start], local[end]
+
+    found, prefixes = initial_prefixes(distance, offsets, targets, start_id, end_id, max_depth, split_depth)
+    for path in found:
+        yield [nodes[node] for node in path]
+    if not prefixes:
+        return
+
+    processes = min(processes or os.cpu_count() or 1, len(prefixes))
+    context = multiprocessing.get_context()
+    block = share_arrays(distance, offsets, targets)
+    tasks = context.Queue()
+    results = context.Queue()
+    queued = context.Value('i', 0)
+    workers = [
+        context.Process(
+            target=path_worker,
+            args=(block.name, (len(distance), len(offsets), len(targets)), end_id, max_depth, split_after,
+                  batch_size, tasks, results, queued),
+            daemon=True,
+        )
+        for _ in range(processes)
+    ]
+    try:
+        for worker in workers:
+            worker.start()
+        outstanding = 0
+
+        def enqueue(new_prefixes):
+            nonlocal outstanding
+            with queued.get_lock():
+                queued.value += len(new_prefixes)
+            for prefix in new_prefixes:
+                tasks.put(prefix)
+            outstanding += len(new_prefixes)
+
+        enqueue(prefixes)
+        while outstanding:
+            if expired(deadline):
+                return
+            try:
+                kind, payload = results.get(timeout=1)
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in workers):
+                    raise RuntimeError("A path worker exited unexpectedly")
+                continue
+            if kind == TASK_PATHS:
+                for path in payload:
+                    yield [nodes[node] for node in path]
+            elif kind == TASK_SPLIT:
+                enqueue(payload)
+            elif kind == TASK_DONE:
+                outstanding -= 1
+            else:
+                raise RuntimeError(payload)
+        for _ in workers:
+            tasks.put(None)
+        for worker in workers:
+            worker.join()
+    finally:
+        # Also reached when the caller stops early (--limit, --timeout)
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in workers:
+            if worker.pid is not None:
+                worker.join()
+        tasks.cancel_join_thread()
+        results.cancel_join_thread()
+        block.close()
+        block.unlink()
@@ -0,0 +1,121 @@
+import json
+from path_search import distances_to_target, enumerate_paths
+
+# Compact goal 12 output. Instead of one joined string per path, the result is
+# written as JSON in one of two shapes that share the common parts of paths:
+#
+#   path-trie  every path once, with shared prefixes stored once:
+#              {"format": "path-trie", "names": [...],
+#               "root": [name_id, is_path_end, [child, ...]]}
+#   path-dag   the minimal subgraph containing every start -> end path within
+#              max_depth, sharing prefixes and suffixes:
+#              {"format": "path-dag", "names": [...], "start": 0, "end": i,
+#               "max_depth": k, "distance": [...], "children": [[...], ...]}
+#              where distance[i] is node i's distance to the end node.
+#
+# expand_paths() turns either document back into paths one at a time.
+
+VERSION = 1
+
+
+class PathTrie:
+    def __init__(self):
+        self.names = []
+        self.name_ids = {}
+        self.root = None
+        self.path_count = 0
+
+    def _name_id(self, name):
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def add(self, path):
+        if self.root is None:
+            self.root = [self._name_id(path[0]), False, {}]
+        node = self.root
+        for name in path[1:]:
+            name_id = self._name_id(name)
+            child = node[2].get(name_id)
+            if child is None:
+                child = node[2][name_id] = [name_id, False, {}]
+            node = child
+        node[1] = True
+        self.path_count += 1
+
+    def to_document(self):
+        def pack(node):
+            return [node[0], node[1], [pack(child) for child in node[2].values()]]
+        return {
+            "format": "path-trie", "version": VERSION, "paths": self.path_count,
+            "names": self.names, "root": pack(self.root) if self.root is not None else None,
+        }
+
+
+def build_path_dag(fetch_parents, start, end, max_depth, name=str):
+    distance, successors = distances_to_target(fetch_parents, end, max_depth)
+    document = {"format": "path-dag", "version": VERSION, "max_depth": max_depth,
+                "names": [], "start": None, "end": None, "distance": [], "children": []}
+    if distance.get(start, max_depth + 1) > max_depth:
+        return document
+
+    # Forward BFS over the pruned edges, keeping an edge only when it lies on
+    # some start -> end walk of at most max_depth relationships
+    index = {start: 0}
+    order = [start]
+    depth = {start: 0}
+    children = [[]]
+    frontier = [start]
+    while frontier:
+        next_frontier = []
+        for node in frontier:
+            for child in successors.get(node, ()):
+                if depth[node] + 1 + distance[child] > max_depth:
+                    continue
+                if child not in index:
+                    index[child] = len(order)
+                    order.append(child)
+                    depth[child] = depth[node] + 1
+                    children.append([])
+                    next_frontier.append(child)
+                children[index[node]].append(index[child])
+        frontier = next_frontier
+
+    document.update({
+        "names": [name(node) for node in order],
+        "start": 0,
+        "end": index.get(end),
+        "distance": [distance[node] for node in order],
+        "children": children,
+    })
+    return document
+
+
+def expand_paths(document):
+    names = document["names"]
+    if document["format"] == "path-trie":
+        if document["root"] is None:
+            return
+        stack = [(document["root"], [names[document["root"][0]]])]
+        while stack:
+            (name_id, is_path_end, children), prefix = stack.pop()
+            if is_path_end:
+                yield prefix
+            for child in reversed(children):
+                stack.append((child, prefix + [names[child[0]]]))
+    elif document["format"] == "path-dag":
+        if document["start"] is None or document["end"] is None:
+            return
+        distance = dict(enumerate(document["distance"]))
+        successors = dict(enumerate(document["children"]))
+        for path in enumerate_paths(distance, successors, document["start"], document["end"], document["max_depth"]):
+            yield [names[node] for node in path]
+    else:
+        raise ValueError(f"Unknown path document format: {document['format']}")
+
+
+def write_document(document, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(document, file, ensure_ascii=False, separators=(',', ':'))
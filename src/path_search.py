@@ -0,0 +1,187 @@
+import time
+
+# Reachability-pruned path enumeration for goal 12.
+#
+# A reverse BFS from the end node records, for every node that can reach it
+# within the search depth, its distance to the target, plus the forward edges
+# that lead into that set. The forward DFS then only follows an edge when the
+# target is still reachable with the remaining budget, so every branch it
+# enters ends in at least one path and the work tracks the number of paths
+# returned instead of the size of the start node's subtree.
+#
+# Both phases are backend-agnostic: nodes are any hashable keys, and
+# `fetch_parents(frontier)` returns the (parent, child) pairs for a whole BFS
+# level, so a Neo4j backend can answer each level with one query.
+#
+# With a `deadline` (time.monotonic() value), both phases give up quietly once
+# it has passed, and the search yields no further paths; the caller reports
+# the timeout.
+
+
+def expired(deadline):
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def distances_to_target(fetch_parents, end, max_depth, deadline=None):
+    distance = {end: 0}
+    successors = {}
+    frontier = [end]
+    for depth in range(1, max_depth + 1):
+        next_frontier = []
+        for edge_count, (parent, child) in enumerate(fetch_parents(frontier)):
+            if edge_count % 4096 == 0 and expired(deadline):
+                return distance, successors
+            successors.setdefault(parent, []).append(child)
+            if parent not in distance:
+                distance[parent] = depth
+                next_frontier.append(parent)
+        if not next_frontier:
+            break
+        frontier = next_frontier
+    return distance, successors
+
+
+# Paths follow Cypher's variable-length semantics: a relationship is used at
+# most once per path, nodes may repeat.
+def enumerate_paths(distance, successors, start, end, max_depth, deadline=None):
+    if distance.get(start, max_depth + 1) > max_depth or expired(deadline):
+        return
+    path = [start]
+    used_edges = set()
+    stack = [iter(successors.get(start, ()))]
+    steps = 0
+    while stack:
+        child = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+            if len(path) > 1:
+                used_edges.discard((path[-2], path[-1]))
+            path.pop()
+            continue
+        edge = (path[-1], child)
+        if distance[child] > max_depth - len(path) or edge in used_edges:
+            continue
+        used_edges.add(edge)
+        path.append(child)
+        if child == end:
+            yield list(path)
+        stack.append(iter(successors.get(child, ())))
+        steps += 1
+        if steps % 4096 == 0 and expired(deadline):
+            return
+
+
+def find_paths(fetch_parents, start, end, max_depth, deadline=None):
+    distance, successors = distances_to_target(fetch_parents, end, max_depth, deadline)
+    return enumerate_paths(distance, successors, start, end, max_depth, deadline)
+
+
+# Number of start -> end paths of every length up to max_depth, as
+# ({length: count}, exact). Per-node counts are pushed forward one depth
+# layer at a time over the edges that lie on some start -> end walk within the
+# depth, O(max_depth * E) without enumerating anything. That counts walks, so
+# it is exact only when those edges form no cycle. Otherwise the paths are
+# enumerated with find_paths' semantics and counted, within a small budget of
+# `exact_limit` paths and `exact_seconds`; beyond it the walk counts are
+# returned with exact=False, as an upper bound.
+def count_paths_by_length(fetch_parents, start, end, max_depth, exact_limit=10000, exact_seconds=0.1):
+    distance, successors = distances_to_target(fetch_parents, end, max_depth)
+    if distance.get(start, max_depth + 1) > max_depth:
+        return {}, True
+    edges = walk_edges(distance, successors, start, max_depth)
+    if not has_cycle(edges, start):
+        return count_walks(edges, distance, start, end, max_depth), True
+    deadline = time.monotonic() + exact_seconds
+    histogram = {}
+    for found, path in enumerate(enumerate_paths(distance, successors, start, end, max_depth, deadline), 1):
+        if found > exact_limit:
+            break
+        histogram[len(path) - 1] = histogram.get(len(path) - 1, 0) + 1
+    else:
+        if not expired(deadline):
+            return histogram, True
+    return count_walks(edges, distance, start, end, max_depth), False
+
+
+# The pruned edges that lie on some start -> end walk of at most max_depth
+# relationships: depth from start + 1 + distance to end fits the budget
+def walk_edges(distance, successors, start, max_depth):
+    depth = {start: 0}
+    edges = {}
+    frontier = [start]
+    while frontier:
+        next_frontier = []
+        for node in frontier:
+            kept = edges[node] = []
+            for child in successors.get(node, ()):
+                if depth[node] + 1 + distance[child] > max_depth:
+                    continue
+                kept.append(child)
+                if child not in depth:
+                    depth[child] = depth[node] + 1
+                    next_frontier.append(child)
+        frontier = next_frontier
+    return edges
+
+
+def has_cycle(edges, start):
+    state = {start: 1}
+    stack = [(start, iter(edges[start]))]
+    while stack:
+        node, children = stack[-1]
+        for child in children:
+            if state.get(child) == 1:
+                return True
+            if child not in state:
+                state[child] = 1
+                stack.append((child, iter(edges[child])))
+                break
+        else:
+            state[node] = 2
+            stack.pop()
+    return False
+
+
+def count_walks(edges, distance, start, end, max_depth):
+    histogram = {}
+    layer = {start: 1}
+    for length in range(1, max_depth + 1):
+        remaining = max_depth - length
+        next_layer = {}
+        for node, count in layer.items():
+            for child in edges[node]:
+                if distance[child] <= remaining:
+                    next_layer[child] = next_layer.get(child, 0) + count
+        if end in next_layer:
+            histogram[length] = next_layer[end]
+        if not next_layer:
+            break
+        layer = next_layer
+    return histogram
+
+
+# Goals 20 and 21: every node within `max_depth` hops of `start`, as
+# (depth, node) pairs in BFS order. `fetch_neighbours(frontier, visited,
+# limit)` yields the neighbours of a whole level. Each node is visited and
+# expanded at most once, so diamonds and cycles in the hierarchy produce no
+# duplicates. With `level_limit`, a level stops after that many new nodes and
+# only those are expanded, which bounds the work below hub categories. It is
+# passed on as `limit`, so a backend that fetches rows from a server can skip
+# the `visited` nodes and stop after `limit` new ones on the server side;
+# other backends may ignore both.
+def expand_levels(fetch_neighbours, start, max_depth, level_limit=None):
+    visited = {start}
+    frontier = [start]
+    for depth in range(1, max_depth + 1):
+        next_frontier = []
+        for neighbour in fetch_neighbours(frontier, visited, level_limit):
+            if neighbour in visited:
+                continue
+            visited.add(neighbour)
+            next_frontier.append(neighbour)
+            yield depth, neighbour
+            if len(next_frontier) == level_limit:
+                break
+        if not next_frontier:
+            return
+        frontier = next_frontier
@@ -0,0 +1,304 @@
+import random
+from array import array
+from collections import deque
+
+# Reachability index for the descendant and ancestor goals.
+#
+# Strongly connected components are found with an iterative Tarjan pass and
+# collapsed, leaving a DAG of components. Tarjan emits a component only after
+# everything reachable from it, so component ids are a reverse topological
+# order: every DAG edge points from a larger id to a smaller one.
+#
+# Each component gets `label_count` GRAIL-style interval labels
+# [low, post], one per randomized DFS of the DAG: post is the post-order rank
+# and low the smallest rank below it. If v is reachable from u, each of v's
+# intervals lies inside u's, so a missing containment answers "no" at once.
+# The first DFS also records spanning-tree [pre, post] intervals, which answer
+# "yes" at once for tree descendants. Only the rest fall back to a DFS,
+# pruned by the same labels. Counts and closures walk the component DAG and
+# are cached per component.
+#
+# Everything is kept in int32 arrays: about 4 * (3 + 2 * label_count)
+# bytes per component plus the component DAG's own CSR arrays. build()
+# computes them from a graph; a snapshot stores them (to_arrays()) and maps
+# them back in.
+
+
+class ReachabilityIndex:
+    def __init__(self, component, member_offsets, members, dag_offsets, dag_targets, cyclic,
+                 rev_offsets, rev_targets, tree_pre, labels):
+        self.component = component
+        self.component_count = len(member_offsets) - 1
+        self.member_offsets = member_offsets
+        self.members = members
+        self.dag_offsets = dag_offsets
+        self.dag_targets = dag_targets
+        self.cyclic = cyclic
+        self.rev_offsets = rev_offsets
+        self.rev_targets = rev_targets
+        # The first traversal's post-order doubles as the spanning-tree one
+        self.tree_pre, self.tree_post = tree_pre, labels[0][1]
+        self.labels = labels
+        self.descendant_counts = {}
+        self.ancestor_counts = {}
+
+    @classmethod
+    def build(cls, graph, label_count=2, seed=0):
+        component, component_count = strongly_connected_components(
+            graph.node_count, graph.fwd_offsets, graph.fwd_targets
+        )
+        member_offsets, members = group_members(component, component_count)
+        dag_offsets, dag_targets, cyclic = condense(graph, component, component_count)
+        rev_offsets, rev_targets = reverse_csr(component_count, dag_offsets, dag_targets)
+        rng = random.Random(seed)
+        tree_pre = None
+        labels = []
+        for traversal in range(label_count):
+            pre, post, low = label_dag(dag_offsets, dag_targets, rev_offsets, rng if traversal else None)
+            if traversal == 0:
+                tree_pre = pre
+            labels.append((low, post))
+        return cls(component, member_offsets, members, dag_offsets, dag_targets, cyclic,
+                   rev_offsets, rev_targets, tree_pre, labels)
+
+    # Every array in snapshot order: component, member_offsets, members,
+    # dag_offsets, dag_targets, cyclic, rev_offsets, rev_targets, tree_pre,
+    # then (low, post) per label
+    def to_arrays(self):
+        arrays = [
+            self.component, self.member_offsets, self.members, self.dag_offsets, self.dag_targets,
+            self.cyclic, self.rev_offsets, self.rev_targets, self.tree_pre,
+        ]
+        for low, post in self.labels:
+            arrays.extend((low, post))
+        return arrays
+
+    def _children(self, component):
+        return self.dag_targets[self.dag_offsets[component]:self.dag_offsets[component + 1]]
+
+    def _parents(self, component):
+        return self.rev_targets[self.rev_offsets[component]:self.rev_offsets[component + 1]]
+
+    def _may_reach(self, source, target):
+        if target > source:
+            return False
+        for low, post in self.labels:
+            if low[target] < low[source] or post[target] > post[source]:
+                return False
+        return True
+
+    def _reaches(self, source, target):
+        if source == target:
+            return True
+        if not self._may_reach(source, target):
+            return False
+        if self.tree_pre[source] <= self.tree_pre[target] and self.tree_post[target] <= self.tree_post[source]:
+            return True
+        visited = {source}
+        stack = [source]
+        while stack:
+            for child in self._children(stack.pop()):
+                if child == target:
+                    return True
+                if child not in visited and self._may_reach(child, target):
+                    visited.add(child)
+                    stack.append(child)
+        return False
+
+    # Whether `descendant` lies below `ancestor` through at least one relationship
+    def is_descendant(self, ancestor, descendant):
+        source, target = self.component[ancestor], self.component[descendant]
+        if source == target:
+            return ancestor != descendant or bool(self.cyclic[source])
+        return self._reaches(source, target)
+
+    def _closure(self, component, neighbours):
+        seen = {component}
+        queue = deque([component])
+        while queue:
+            for neighbour in neighbours(queue.popleft()):
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append(neighbour)
+                    yield neighbour
+
+    def _component_size(self, component):
+        return self.member_offsets[component + 1] - self.member_offsets[component]
+
+    def _count(self, node_id, neighbours, cache):
+        component = self.component[node_id]
+        count = cache.get(component)
+        if count is None:
+            count = self._component_size(component) - 1
+            count += sum(self._component_size(other) for other in self._closure(component, neighbours))
+            cache[component] = count
+        return count
+
+    def _list(self, node_id, neighbours):
+        component = self.component[node_id]
+        for member in self._members(component):
+            if member != node_id:
+                yield member
+        for other in self._closure(component, neighbours):
+            yield from self._members(other)
+
+    def _members(self, component):
+        return self.members[self.member_offsets[component]:self.member_offsets[component + 1]]
+
+    def descendant_count(self, node_id):
+        return self._count(node_id, self._children, self.descendant_counts)
+
+    def ancestor_count(self, node_id):
+        return self._count(node_id, self._parents, self.ancestor_counts)
+
+    # Node ids below / above `node_id`, nearest components first
+    def descendants(self, node_id):
+        return self._list(node_id, self._children)
+
+    def ancestors(self, node_id):
+        return self._list(node_id, self._parents)
+
+
+# One DFS over the component DAG from its roots: (pre, post, low) ranks.
+# Children are visited in stored order, or shuffled when `rng` is given.
+def label_dag(dag_offsets, dag_targets, rev_offsets, rng):
+    count = len(dag_offsets) - 1
+    pre = array('i', [-1]) * count
+    post = array('i', [0]) * count
+
+    def ordered_children(component):
+        children = list(dag_targets[dag_offsets[component]:dag_offsets[component + 1]])
+        if rng is not None:
+            rng.shuffle(children)
+        return iter(children)
+
+    roots = [component for component in range(count) if rev_offsets[component] == rev_offsets[component + 1]]
+    if rng is not None:
+        rng.shuffle(roots)
+    pre_rank = 0
+    post_rank = 0
+    for root in roots:
+        pre[root] = pre_rank
+        pre_rank += 1
+        stack = [(root, ordered_children(root))]
+        while stack:
+            component, children = stack[-1]
+            for child in children:
+                if pre[child] == -1:
+                    pre[child] = pre_rank
+                    pre_rank += 1
+                    stack.append((child, ordered_children(child)))
+                    break
+            else:
+                stack.pop()
+                post[component] = post_rank
+                post_rank += 1
+
+    # Children have smaller ids, so one pass in id order sees them first
+    low = array('i', post)
+    for component in range(count):
+        for child in dag_targets[dag_offsets[component]:dag_offsets[component + 1]]:
+            if low[child] < low[component]:
+                low[component] = low[child]
+    return pre, post, low
+
+
+# Iterative Tarjan over CSR arrays: (component id per node, component count)
+def strongly_connected_components(node_count, offsets, targets):
+    index = array('i', [-1]) * node_count
+    low = array('i', [0]) * node_count
+    component = array('i', [-1]) * node_count
+    on_stack = bytearray(node_count)
+    stack = []
+    counter = 0
+    component_count = 0
+    for root in range(node_count):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        work = [[root, offsets[root]]]
+        while work:
+            frame = work[-1]
+            node, position = frame
+            if position < offsets[node + 1]:
+                frame[1] = position + 1
+                child = targets[position]
+                if index[child] == -1:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack[child] = 1
+                    work.append([child, offsets[child]])
+                elif on_stack[child] and index[child] < low[node]:
+                    low[node] = index[child]
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if low[node] < low[parent]:
+                    low[parent] = low[node]
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = 0
+                    component[member] = component_count
+                    if member == node:
+                        break
+                component_count += 1
+    return component, component_count
+
+
+def group_members(component, component_count):
+    offsets = array('i', [0]) * (component_count + 1)
+    for owner in component:
+        offsets[owner + 1] += 1
+    for i in range(component_count):
+        offsets[i + 1] += offsets[i]
+    members = array('i', [0]) * len(component)
+    cursor = offsets[:-1]
+    for node_id, owner in enumerate(component):
+        members[cursor[owner]] = node_id
+        cursor[owner] += 1
+    return offsets, members
+
+
+# Component DAG as CSR, plus a flag per component that lies on a cycle
+# (more than one member, or a self-loop)
+def condense(graph, component, component_count):
+    cyclic = bytearray(component_count)
+    children = [None] * component_count
+    for node_id in range(graph.node_count):
+        source = component[node_id]
+        for child in graph.children(node_id):
+            target = component[child]
+            if target == source:
+                cyclic[source] = 1
+                continue
+            if children[source] is None:
+                children[source] = {}
+            children[source][target] = None
+    offsets = array('i', [0])
+    targets = array('i')
+    for source in range(component_count):
+        if children[source]:
+            targets.extend(children[source])
+        offsets.append(len(targets))
+    return offsets, targets, cyclic
+
+
+def reverse_csr(count, offsets, targets):
+    reverse_offsets = array('i', [0]) * (count + 1)
+    for target in targets:
+        reverse_offsets[target + 1] += 1
+    for i in range(count):
+        reverse_offsets[i + 1] += reverse_offsets[i]
+    reverse_targets = array('i', [0]) * len(targets)
+    cursor = reverse_offsets[:-1]
+    for source in range(count):
+        for target in targets[offsets[source]:offsets[source + 1]]:
+            reverse_targets[cursor[target]] = source
+            cursor[target] += 1
+    return reverse_offsets, reverse_targets
@@ -0,0 +1,102 @@
+import json
+import sqlite3
+import time
+import threading
+from config import cache_file, cache_max_entries
+
+# Persistent cache of goal output, shared by every dbcli process on the machine.
+#
+# Entries are keyed by goal, arguments and the graph version stamp stored in
+# the same database. Anything that changes the graph (goal 11, goal 13, the
+# importers) calls bump_version(), which makes every older entry unreachable
+# and drops it. The least recently used entries are evicted beyond
+# `max_entries`; hit and miss counters are kept alongside.
+#
+# A miss returns the version it was looked up under, and put() stores the
+# result only if the graph is still at that version. A write that lands while
+# the goal is running, from any process or server thread, therefore makes the
+# result uncacheable instead of filing it under the new version.
+
+
+class ResultCache:
+    def __init__(self, path=cache_file, max_entries=cache_max_entries):
+        self.max_entries = max_entries
+        # One connection shared by the threads of a long-lived server
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        self.connection.execute(
+            "INSERT OR IGNORE INTO meta (name, value) VALUES ('version', 0), ('hits', 0), ('misses', 0)"
+        )
+
+    def close(self):
+        self.connection.close()
+
+    def _meta(self, name):
+        return self.connection.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()[0]
+
+    def _increment(self, name):
+        self.connection.execute("UPDATE meta SET value = value + 1 WHERE name = ?", (name,))
+
+    def version(self):
+        with self.lock:
+            return self._meta("version")
+
+    def bump_version(self):
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self._increment("version")
+            self.connection.execute("DELETE FROM results")
+
+    def stats(self):
+        with self.lock:
+            return self._meta("hits"), self._meta("misses")
+
+    def _key(self, goal, args, version):
+        return json.dumps([goal, list(args), version])
+
+    # (cached value or None, graph version the lookup was made under)
+    def get(self, goal, args):
+        with self.lock:
+            version = self._meta("version")
+            key = self._key(goal, args, version)
+            row = self.connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._increment("misses")
+                return None, version
+            self.connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._increment("hits")
+            return json.loads(row[0]), version
+
+    # Stores `value` computed at graph `version`; returns False, storing
+    # nothing, when the graph has changed since
+    def put(self, goal, args, version, value):
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            if self._meta("version") != version:
+                return False
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results (key, value, last_used) VALUES (?, ?, ?)",
+                (self._key(goal, args, version), json.dumps(value), time.time()),
+            )
+            self.connection.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            return True
+
+
+# Called after any write to the graph so cached results never go stale
+def invalidate_cache():
+    cache = ResultCache()
+    try:
+        cache.bump_version()
+    finally:
+        cache.close()
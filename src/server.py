@@ -0,0 +1,176 @@
+import json
+import os
+import socket
+import socketserver
+import sys
+import time
+import memory_goals
+from config import socket_path
+from dbcli import (
+    NODE_GOALS, GRAPH_GOALS, REACH_GOALS, HOP_GOALS, NodeNotFound, check_nodes, cached_goal_lines, count_path_lines,
+    hop_goal_lines, open_backend, pop_flag, pop_option, shortest_path_lines,
+)
+from result_cache import ResultCache, invalidate_cache
+from snapshot import open_graph
+from utils import get_driver, close_driver
+
+# Long-lived query server: keeps the Neo4j driver and its connection pool, the
+# in-memory graph (--memory) and the result cache resident between calls.
+#
+# Protocol: line-delimited JSON over a Unix domain socket. A client sends one
+# request per line,
+#   {"goal": 1, "args": ["Centuries"], "top": null, "count": false, "undirected": false,
+#    "level_limit": null}
+# and receives one {"line": "..."} message per output line, followed by
+#   {"ok": true, "elapsed": 0.0012, "cache": "hit" | "miss" | null}
+# or {"ok": false, "error": "..."}. A connection may carry any number of
+# requests. Each connection is served by its own thread, and all of them share
+# the driver's pool.
+
+
+class GoalServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, graph=None):
+        self.graph = graph
+        self.driver = get_driver() if graph is None else None
+        self.cache = ResultCache() if graph is None else None
+        super().__init__(path, GoalRequestHandler)
+
+    def goal_output(self, request):
+        goal = int(request["goal"])
+        args = [str(arg) for arg in request.get("args", [])]
+        if goal in NODE_GOALS:
+            if len(args) != 1:
+                raise ValueError(f"Goal {goal} takes one node name")
+            return cached_goal_lines(self.driver, self.graph, self.cache, goal, args)
+        if goal in GRAPH_GOALS:
+            return cached_goal_lines(self.driver, self.graph, self.cache, goal, args, request.get("top"))
+        if goal in REACH_GOALS:
+            if len(args) != (2 if goal == 14 else 1):
+                raise ValueError(f"Goal {goal} takes " + ("<ancestor> <descendant>" if goal == 14 else "one node name"))
+            return cached_goal_lines(self.driver, self.graph, self.cache, goal, args)
+        if goal in HOP_GOALS:
+            if len(args) != 2:
+                raise ValueError(f"Goal {goal} takes <node_name> <max_depth>")
+            level_limit = request.get("level_limit")
+            if level_limit is not None:
+                level_limit = int(level_limit)
+                if level_limit < 1:
+                    raise ValueError(f"level_limit must be at least 1, got {level_limit}")
+            return None, self.hop_lines(goal, args[0], int(args[1]), level_limit)
+        if goal == 11:
+            if len(args) != 2:
+                raise ValueError("Goal 11 takes <old_name> <new_name>")
+            return None, self.rename_lines(*args)
+        if goal == 12:
+            if len(args) not in (2, 3):
+                raise ValueError("Goal 12 takes <start_node> <end_node> [search_depth]")
+            search_depth = int(args[2]) if len(args) == 3 else 10
+            return None, self.path_lines(args[0], args[1], search_depth, request.get("count", False))
+        if goal == 19:
+            if len(args) not in (2, 3):
+                raise ValueError("Goal 19 takes <start_node> <end_node> [k]")
+            k = int(args[2]) if len(args) == 3 else 1
+            return None, self.shortest_lines(args[0], args[1], k, not request.get("undirected", False))
+        raise ValueError(f"Goal {goal} is not served")
+
+    def rename_lines(self, old_name, new_name):
+        with open_backend(self.driver, self.graph) as (backend, tx):
+            check_nodes(backend, tx, old_name)
+            success = backend.rename_node(tx, old_name, new_name)
+        if self.graph is None:
+            invalidate_cache()
+        if success:
+            yield f"Renamed node '{old_name}' to '{new_name}' successfully."
+
+    def hop_lines(self, goal, node_name, max_depth, level_limit):
+        with open_backend(self.driver, self.graph) as (backend, tx):
+            check_nodes(backend, tx, node_name)
+            yield from hop_goal_lines(backend, tx, goal, node_name, max_depth, level_limit)
+
+    def shortest_lines(self, start_node, end_node, k, directed):
+        with open_backend(self.driver, self.graph) as (backend, tx):
+            check_nodes(backend, tx, start_node, end_node)
+            yield from shortest_path_lines(backend, tx, start_node, end_node, k, directed)
+
+    def path_lines(self, start_node, end_node, search_depth, count_only):
+        if search_depth < 1:
+            raise ValueError("Searching at depth 0 is not possible.")
+        with open_backend(self.driver, self.graph) as (backend, tx):
+            check_nodes(backend, tx, start_node, end_node)
+            if count_only:
+                yield from count_path_lines(backend, tx, start_node, end_node, search_depth)
+                return
+            find_paths = memory_goals.find_all_paths if self.graph is not None else backend.find_all_paths_pruned
+            total_paths = 0
+            for path in find_paths(tx, start_node, end_node, search_depth):
+                yield f"Path: {path}"
+                total_paths += 1
+            yield f"Total Paths Found: {total_paths}"
+
+
+class GoalRequestHandler(socketserver.StreamRequestHandler):
+    def send(self, message):
+        self.wfile.write(json.dumps(message).encode('utf-8') + b"\n")
+
+    def handle(self):
+        for raw in self.rfile:
+            if not raw.strip():
+                continue
+            started = time.time()
+            try:
+                hit, output = self.server.goal_output(json.loads(raw))
+                for line in output:
+                    self.send({"line": line})
+                cache = None if hit is None else ("hit" if hit else "miss")
+                self.send({"ok": True, "elapsed": time.time() - started, "cache": cache})
+            except (NodeNotFound, ValueError, KeyError) as e:
+                self.send({"ok": False, "error": str(e)})
+            except Exception as e:
+                self.send({"ok": False, "error": f"An error occurred: {str(e)}"})
+            self.wfile.flush()
+
+
+# Removes a socket file left behind by a server that is gone. False when a
+# server still accepts connections on it, which keeps its socket.
+def claim_socket(path):
+    if not os.path.exists(path):
+        return True
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.remove(path)
+        return True
+    finally:
+        probe.close()
+    return False
+
+
+def main():
+    args = sys.argv[1:]
+    use_memory = pop_flag(args, "--memory")
+    path = pop_option(args, "--socket", socket_path, cast=str)
+
+    if not claim_socket(path):
+        print(f"A server is already running on {path}.")
+        sys.exit(1)
+    graph = open_graph() if use_memory else None
+    server = GoalServer(path, graph)
+    os.chmod(path, 0o600)
+    print(f"Serving goals on {path}" + (" from the in-memory graph" if use_memory else ""))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
+        if server.cache is not None:
+            server.cache.close()
+        close_driver()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import heapq
+
+# Shortest-path engine shared by both backends.
+#
+# The graph is reached only through two frontier expanders, so the Neo4j
+# backend can fetch a whole BFS level per query, as path_search.py does:
+#   expand_forward(frontier)  -> (node, next) pairs for edges node -> next
+#   expand_backward(frontier) -> (node, previous) pairs for edges previous -> node
+# For an undirected search both expanders return the edges in either
+# direction.
+#
+# shortest_path() is a level-synchronous bidirectional BFS that always grows
+# the smaller frontier. k_shortest_paths() is Yen's algorithm on top of it:
+# each next path is the shortest deviation from an earlier path that avoids
+# the edges already taken from the same root, so every path is loopless.
+
+
+def shortest_path(expand_forward, expand_backward, start, end, blocked_nodes=frozenset(), blocked_edges=frozenset()):
+    if start == end:
+        return [start]
+    forward = {start: None}
+    backward = {end: None}
+    depth = {(True, start): 0, (False, end): 0}
+    forward_frontier = [start]
+    backward_frontier = [end]
+    while forward_frontier and backward_frontier:
+        grow_forward = len(forward_frontier) <= len(backward_frontier)
+        if grow_forward:
+            visited, other, frontier, expand = forward, backward, forward_frontier, expand_forward
+        else:
+            visited, other, frontier, expand = backward, forward, backward_frontier, expand_backward
+
+        next_frontier = []
+        meeting = None
+        for node, neighbour in expand(frontier):
+            if neighbour in visited or neighbour in blocked_nodes:
+                continue
+            edge = (node, neighbour) if grow_forward else (neighbour, node)
+            if edge in blocked_edges:
+                continue
+            visited[neighbour] = node
+            next_frontier.append(neighbour)
+            # The other side may have reached this node on any of its levels,
+            # so keep the meeting point closest to the other end
+            if neighbour in other:
+                other_depth = depth[(not grow_forward, neighbour)]
+                if meeting is None or other_depth < meeting_depth:
+                    meeting, meeting_depth = neighbour, other_depth
+        if meeting is not None:
+            return trace(forward, meeting)[::-1] + trace(backward, meeting)[1:]
+        level = depth[(grow_forward, frontier[0])] + 1
+        for node in next_frontier:
+            depth[(grow_forward, node)] = level
+        if grow_forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+    return None
+
+
+def trace(previous, node):
+    path = []
+    while node is not None:
+        path.append(node)
+        node = previous[node]
+    return path
+
+
+def k_shortest_paths(expand_forward, expand_backward, start, end, k=1):
+    first = shortest_path(expand_forward, expand_backward, start, end)
+    if first is None:
+        return
+    found = [first]
+    yield first
+    candidates = []
+    seen = {tuple(first)}
+    while len(found) < k:
+        last = found[-1]
+        for i in range(len(last) - 1):
+            spur_node = last[i]
+            root = last[:i + 1]
+            blocked_edges = {
+                (path[i], path[i + 1]) for path in found if len(path) > i + 1 and path[:i + 1] == root
+            }
+            blocked_nodes = set(root[:-1])
+            spur = shortest_path(expand_forward, expand_backward, spur_node, end, blocked_nodes, blocked_edges)
+            if spur is None:
+                continue
+            candidate = root[:-1] + spur
+            if tuple(candidate) not in seen:
+                seen.add(tuple(candidate))
+                heapq.heappush(candidates, (len(candidate), len(seen), candidate))
+        if not candidates:
+            return
+        _, _, path = heapq.heappop(candidates)
+        found.append(path)
+        yield path
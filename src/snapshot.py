@@ -0,0 +1,186 @@
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from config import data_file, snapshot_file
+from csr_graph import CSRGraph, load_graph
+from name_index import NameIndex
+from degree_index import DegreeIndex
+from reachability import ReachabilityIndex
+
+# Binary snapshot of a CSRGraph that can be memory-mapped and queried in place.
+#
+# Layout (native little-endian, every section 8-byte aligned):
+#   header        magic, format version, node count, edge count, name bytes,
+#                 section counts, and the size and mtime of the source CSV
+#   fwd_offsets   int64[node_count + 1]
+#   fwd_targets   int32[edge_count]
+#   rev_offsets   int64[node_count + 1]
+#   rev_targets   int32[edge_count]
+#   name_offsets  int64[node_count + 1]   byte offsets into the name table
+#   name_order    int32[node_count]       node ids sorted by UTF-8 name
+#   names         UTF-8 names, concatenated in node id order (8-byte padded)
+#   roots         int32[]  degree index: nodes without parents
+#   top           int32[]  degree index: nodes with the most children
+#   min_bucket    int32[]  degree index: nodes with the fewest (> 0) children
+#   reachability index (reachability.py), over C components and D DAG edges:
+#     component       int32[node_count]  component id of every node
+#     member_offsets  int32[C + 1]
+#     members         int32[node_count]  node ids grouped by component
+#     dag_offsets     int32[C + 1]       condensed DAG, children
+#     dag_targets     int32[D]
+#     cyclic          uint8[C]           components that lie on a cycle
+#     rev_offsets     int32[C + 1]       condensed DAG, parents
+#     rev_targets     int32[D]
+#     tree_pre        int32[C]           spanning-tree pre-order ranks
+#     low, post       int32[C] each, per interval label
+#
+# Loading maps the file read-only and wraps each section in a memoryview, so
+# nothing is parsed or copied, and every process reading the same snapshot
+# shares its pages through the OS page cache.
+
+MAGIC = b"WIKITAXO"
+VERSION = 4
+HEADER = struct.Struct("<8sIxxxxQQQQQQQQQQQQQ")
+
+
+def _padding(size):
+    return -size % 8
+
+
+# The (size, mtime in ns) a snapshot records for its source file
+def source_stamp(file_path):
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+# `source` is the CSV the graph was loaded from; open_graph() compares it with
+# data_file to notice a stale snapshot
+def export_snapshot(graph, path, source=None):
+    encoded = [graph.name(node_id).encode('utf-8') for node_id in range(graph.node_count)]
+    name_offsets = array('q', [0])
+    for name in encoded:
+        name_offsets.append(name_offsets[-1] + len(name))
+    name_order = array('i', sorted(range(graph.node_count), key=encoded.__getitem__))
+
+    degrees = graph.degrees
+    roots, top, min_bucket = degrees.to_arrays()
+    reachability = graph.reachability
+
+    sections = [
+        array('q', graph.fwd_offsets), array('i', graph.fwd_targets),
+        array('q', graph.rev_offsets), array('i', graph.rev_targets),
+        name_offsets, name_order,
+    ]
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(
+            MAGIC, VERSION, graph.node_count, graph.edge_count, name_offsets[-1],
+            len(roots), len(top), degrees.capacity, degrees.min_degree, len(min_bucket),
+            reachability.component_count, len(reachability.dag_targets), len(reachability.labels),
+            *(source_stamp(source) if source else (0, 0)),
+        ))
+        for section in sections:
+            data = section.tobytes()
+            file.write(data + bytes(_padding(len(data))))
+        for name in encoded:
+            file.write(name)
+        file.write(bytes(_padding(name_offsets[-1])))
+        for section in (roots, top, min_bucket, *reachability.to_arrays()):
+            data = bytes(section)
+            file.write(data + bytes(_padding(len(data))))
+
+
+class MappedGraph(CSRGraph):
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self._mmap)[:2]
+        if magic != MAGIC or sys.byteorder != 'little':
+            raise ValueError(f"{path} is not a taxonomy snapshot for this platform")
+        if version != VERSION:
+            raise ValueError(f"{path} has snapshot format {version}, expected {VERSION}")
+        (node_count, edge_count, name_bytes,
+         root_count, top_count, top_capacity, min_degree, min_count,
+         component_count, dag_edge_count, label_count,
+         source_size, source_mtime) = HEADER.unpack_from(self._mmap)[2:]
+        self.source_stamp = (source_size, source_mtime) if source_size else None
+
+        view = memoryview(self._mmap)
+        position = HEADER.size
+
+        def section(typecode, count):
+            nonlocal position
+            size = count * struct.calcsize(typecode)
+            data = view[position:position + size].cast(typecode)
+            position += size + _padding(size)
+            return data
+
+        fwd_offsets = section('q', node_count + 1)
+        fwd_targets = section('i', edge_count)
+        rev_offsets = section('q', node_count + 1)
+        rev_targets = section('i', edge_count)
+        name_offsets = section('q', node_count + 1)
+        name_order = section('i', node_count)
+        names = MappedNames(view[position:position + name_bytes], name_offsets)
+        position += name_bytes + _padding(name_bytes)
+        roots = section('i', root_count)
+        top = section('i', top_count)
+        min_bucket = section('i', min_count)
+        component = section('i', node_count)
+        member_offsets = section('i', component_count + 1)
+        members = section('i', node_count)
+        dag_offsets = section('i', component_count + 1)
+        dag_targets = section('i', dag_edge_count)
+        cyclic = section('B', component_count)
+        dag_rev_offsets = section('i', component_count + 1)
+        dag_rev_targets = section('i', dag_edge_count)
+        tree_pre = section('i', component_count)
+        labels = [(section('i', component_count), section('i', component_count)) for _ in range(label_count)]
+        super().__init__(NameIndex(names, name_order), fwd_offsets, fwd_targets, rev_offsets, rev_targets)
+        self._degrees = DegreeIndex(self, roots, top, min_degree, min_bucket, top_capacity)
+        self._reachability = ReachabilityIndex(
+            component, member_offsets, members, dag_offsets, dag_targets, cyclic,
+            dag_rev_offsets, dag_rev_targets, tree_pre, labels,
+        )
+
+
+# Read-only sequence view of the packed name table, decoded on access
+class MappedNames:
+    def __init__(self, table, offsets):
+        self.table = table
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, node_id):
+        return str(self.table[self.offsets[node_id]:self.offsets[node_id + 1]], 'utf-8')
+
+
+def load_snapshot(path):
+    return MappedGraph(path)
+
+
+# The snapshot when one has been exported from the current data_file, the CSV
+# dump otherwise. A snapshot of an older dump is not used: it would answer
+# from the old graph.
+def open_graph():
+    if os.path.exists(snapshot_file):
+        graph = load_snapshot(snapshot_file)
+        if not os.path.exists(data_file) or graph.source_stamp == source_stamp(data_file):
+            return graph
+        print(f"{snapshot_file} was not exported from the current {data_file}; loading the CSV instead. "
+              f"Run snapshot.py to re-export it.", file=sys.stderr)
+    return load_graph(data_file)
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else data_file
+    target = sys.argv[2] if len(sys.argv) > 2 else snapshot_file
+    start_time = time.time()
+    graph = load_graph(source)
+    export_snapshot(graph, target, source)
+    print(f"Wrote {graph.node_count} nodes and {graph.edge_count} relationships to {target} "
+          f"in {time.time() - start_time:.4f} seconds.")
@@ -1,17 +1,45 @@
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, AsyncGraphDatabase
 from config import uri, username, password
 import time
+import difflib
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from neo4j.exceptions import TransientError, ServiceUnavailable
 
-driver = GraphDatabase.driver(uri, auth=(username, password))
+driver = None
+driver_lock = threading.Lock()
 
+# The driver is created on first use, so modules that never talk to Neo4j
+# (the --memory backend) do not build one
 def get_driver():
-    return driver
+    global driver
+    with driver_lock:
+        if driver is None:
+            driver = GraphDatabase.driver(uri, auth=(username, password))
+        return driver
 
 def close_driver():
-    driver.close()
+    global driver
+    with driver_lock:
+        if driver is not None:
+            driver.close()
+            driver = None
+
+async_driver = None
+
+# Async driver for goal 12; created on first use like the sync one
+def get_async_driver():
+    global async_driver
+    if async_driver is None:
+        async_driver = AsyncGraphDatabase.driver(uri, auth=(username, password))
+    return async_driver
+
+async def close_async_driver():
+    global async_driver
+    if async_driver is not None:
+        await async_driver.close()
+        async_driver = None
 
 def create_relationships(tx, batch):
     query = (
@@ -22,6 +50,22 @@ def create_relationships(tx, batch):
     )
     tx.run(query, batch=batch)
 
+def create_nodes(tx, names):
+    query = (
+        "UNWIND $names as name "
+        "CREATE (:Category {name: name})"
+    )
+    tx.run(query, names=names)
+
+def create_relationships_between_existing(tx, batch):
+    query = (
+        "UNWIND $batch as row "
+        "MATCH (c:Category {name: row.category}) "
+        "MATCH (s:Category {name: row.subcategory}) "
+        "MERGE (c)-[:HAS_SUBCATEGORY]->(s)"
+    )
+    tx.run(query, batch=batch)
+
 def create_unique_constraint(tx):
     query = (
         "CREATE CONSTRAINT unique_category_name IF NOT EXISTS "
@@ -36,9 +80,47 @@ def create_index(tx):
     tx.run(query)
 
 def process_batch(batch):
-    with driver.session() as session:
+    with get_driver().session() as session:
         session.write_transaction(create_relationships, batch)
 
+def process_node_batch(names):
+    with get_driver().session() as session:
+        session.execute_write(create_nodes, names)
+    return len(names)
+
+def process_relationship_batch(batch):
+    with get_driver().session() as session:
+        session.execute_write(create_relationships_between_existing, batch)
+    return len(batch)
+
+def delete_relationships(tx, batch):
+    query = (
+        "UNWIND $batch as row "
+        "MATCH (c:Category {name: row.category})-[r:HAS_SUBCATEGORY]->(s:Category {name: row.subcategory}) "
+        "DELETE r"
+    )
+    tx.run(query, batch=batch)
+
+# Categories left without any relationship, which a full import never creates
+def delete_orphan_nodes(tx, names):
+    query = (
+        "UNWIND $names as name "
+        "MATCH (n:Category {name: name}) "
+        "WHERE NOT (n)--() "
+        "DELETE n "
+        "RETURN count(n) AS deleted_count"
+    )
+    return tx.run(query, names=names).single()["deleted_count"]
+
+def process_removal_batch(batch):
+    with get_driver().session() as session:
+        session.execute_write(delete_relationships, batch)
+    return len(batch)
+
+def process_orphan_batch(names):
+    with get_driver().session() as session:
+        return session.execute_write(delete_orphan_nodes, names)
+
 def delete_nodes_batch(tx, batch_size):
     query = (
         "MATCH (n:Category) "
@@ -88,10 +170,137 @@ def delete_all_nodes_in_batches(batch_size=5000, num_threads=3, max_retries=3):
 
     print(f"Finished deleting nodes. Total nodes deleted: {total_deleted}")
 
+# Fast wipe (goal 13 --fast). Relationships go first, then nodes, and every
+# worker owns a disjoint range of internal ids, looked up id by id
+# (NodeByIdSeek). A relationship belongs to the range of its parent, so no two
+# workers ever delete the same records.
+
+def category_id_range(tx):
+    query = "MATCH (n:Category) RETURN min(id(n)) AS low, max(id(n)) AS high"
+    record = tx.run(query).single()
+    return record["low"], record["high"]
+
+def count_remaining(tx):
+    nodes = tx.run("MATCH (n:Category) RETURN count(n) AS count").single()["count"]
+    relationships = tx.run("MATCH ()-[r:HAS_SUBCATEGORY]->() RETURN count(r) AS count").single()["count"]
+    return nodes, relationships
+
+def delete_relationships_in_id_range(tx, low, high, batch_size):
+    query = (
+        "UNWIND range($low, $high - 1) AS node_id "
+        "MATCH (n:Category)-[r:HAS_SUBCATEGORY]->() WHERE id(n) = node_id "
+        "WITH r LIMIT $batch_size "
+        "DELETE r "
+        "RETURN count(r) AS deleted_count"
+    )
+    return tx.run(query, low=low, high=high, batch_size=batch_size).single()["deleted_count"]
+
+def delete_nodes_in_id_range(tx, low, high):
+    query = (
+        "UNWIND range($low, $high - 1) AS node_id "
+        "MATCH (n:Category) WHERE id(n) = node_id "
+        "DETACH DELETE n "
+        "RETURN count(n) AS deleted_count"
+    )
+    return tx.run(query, low=low, high=high).single()["deleted_count"]
+
+def write_with_retries(driver, work, max_retries, *args):
+    retries = 0
+    while True:
+        try:
+            with driver.session() as session:
+                return session.execute_write(work, *args)
+        except (TransientError, ServiceUnavailable):
+            retries += 1
+            if retries == max_retries:
+                raise
+            time.sleep((2 ** retries) * 0.5)
+
+# One worker's share: its id range in windows of `batch_size` ids. A window
+# is re-run until it comes back short, so hubs with more than `batch_size`
+# relationships are cleared too.
+def wipe_id_range(driver, phase, low, high, batch_size, max_retries, progress):
+    deleted = 0
+    for window in range(low, high, batch_size):
+        window_high = min(window + batch_size, high)
+        while True:
+            if phase == "relationships":
+                count = write_with_retries(
+                    driver, delete_relationships_in_id_range, max_retries, window, window_high, batch_size
+                )
+            else:
+                count = write_with_retries(driver, delete_nodes_in_id_range, max_retries, window, window_high)
+            deleted += count
+            progress.update(count)
+            if phase == "nodes" or count < batch_size:
+                break
+    return deleted
+
+def wipe_phase(driver, executor, phase, low, high, batch_size, num_threads, max_retries):
+    started = time.time()
+    span = -(-(high - low) // num_threads)
+    with tqdm(desc=f"Deleting {phase}", unit="rows") as progress:
+        futures = [
+            executor.submit(wipe_id_range, driver, phase, start, min(start + span, high), batch_size, max_retries, progress)
+            for start in range(low, high, span)
+        ]
+        deleted = sum(future.result() for future in futures)
+    elapsed = time.time() - started
+    print(f"Deleted {deleted} {phase} in {elapsed:.4f} seconds ({deleted / elapsed if elapsed else 0:.0f} rows/s).")
+    return deleted
+
+def delete_all_fast(batch_size=5000, num_threads=4, max_retries=3, max_rounds=10):
+    started = time.time()
+    driver = get_driver()
+    total_deleted = 0
+    try:
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            for _ in range(max_rounds):
+                with driver.session() as session:
+                    low, high = session.execute_read(category_id_range)
+                if low is not None:
+                    for phase in ("relationships", "nodes"):
+                        total_deleted += wipe_phase(
+                            driver, executor, phase, low, high + 1, batch_size, num_threads, max_retries
+                        )
+                # Writes that raced with the wipe are picked up by another round
+                with driver.session() as session:
+                    nodes, relationships = session.execute_read(count_remaining)
+                if nodes == 0 and relationships == 0:
+                    break
+                print(f"{nodes} nodes and {relationships} relationships remain, starting another round.")
+            else:
+                print(f"Database still not empty after {max_rounds} rounds.")
+    finally:
+        close_driver()
+
+    elapsed = time.time() - started
+    print(f"Finished wiping the database. Total rows deleted: {total_deleted} in {elapsed:.4f} seconds "
+          f"({total_deleted / elapsed if elapsed else 0:.0f} rows/s).")
+
 def node_exists(tx, node_name):
     query = (
         "MATCH (n:Category {name: $node_name}) "
-        "RETURN n.name AS name"
+        "RETURN n.name AS name LIMIT 1"
     )
     result = tx.run(query, node_name=node_name)
-    return len(list(result)) > 0
+    return result.peek() is not None
+
+def find_names_with_prefix(tx, prefix, limit=500):
+    query = (
+        "MATCH (n:Category) WHERE n.name STARTS WITH $prefix "
+        "RETURN n.name AS name ORDER BY name LIMIT $limit"
+    )
+    result = tx.run(query, prefix=prefix, limit=limit)
+    return [record["name"] for record in result]
+
+# "Did you mean" candidates for a missing name: the names sharing the longest
+# prefix with it (index range scans on :Category(name)), ranked by similarity
+def suggest_names(tx, node_name, limit=5):
+    length = len(node_name)
+    while length > 0:
+        candidates = find_names_with_prefix(tx, node_name[:length])
+        if candidates:
+            return difflib.get_close_matches(node_name, candidates, n=limit, cutoff=0)
+        length //= 2
+    return []